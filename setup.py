@@ -11,5 +11,10 @@ setup(
         "pandas",
         "jinja2",
         "aiosmtplib"
-    ]
+    ],
+    entry_points={
+        "console_scripts": [
+            "smtp-stress-test=smtp_stress_test.cli:main"
+        ]
+    }
 )
@@ -0,0 +1,242 @@
+"""Headless runner: execute a scenario file without the web UI.
+
+    smtp-stress-test scenario.json --format json --max-failure-rate 1
+
+Heavy modules (pandas, jinja2) are only imported once the run is over and a
+summary or report is built, so the command starts sending right away.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_FAILURE_RATE = 2
+EXIT_GENERATOR_SATURATED = 3
+EXIT_INTERRUPTED = 130
+
+
+def positive_float(value: str) -> float:
+    """argparse type of rate options: a rate of zero or less could never send"""
+    number = float(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be positive, got {value}")
+    return number
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="smtp-stress-test",
+        description="Run an SMTP stress test scenario from the command line"
+    )
+    parser.add_argument("scenario", type=Path, help="Scenario JSON file")
+    parser.add_argument("--format", choices=("text", "json", "html"), default="text",
+                        help="text: summary on stdout, json: statistics on stdout, "
+                             "html: write HTML and JSON reports to --output-dir")
+    parser.add_argument("--output-dir", type=Path, default=None,
+                        help="Directory for report files (default: reports, only written with --format html "
+                             "unless given explicitly)")
+    parser.add_argument("--compression", choices=("gzip", "zstd"), default=None,
+                        help="Compress the JSON report (zstd needs the zstandard package)")
+    parser.add_argument("--attachment-dir", type=Path,
+                        default=Path(__file__).resolve().parent / "scenarios" / "attachments",
+                        help="Attachment store for sha256: attachment references (default: the web UI's store)")
+    parser.add_argument("--connect-timeout", type=float, default=1.0, help="SMTP connection timeout in seconds")
+    parser.add_argument("--send-timeout", type=float, default=1.0, help="SMTP send timeout in seconds")
+    parser.add_argument("--max-rate", type=positive_float, default=None, help="Limit the send rate (emails/second)")
+    parser.add_argument("--transfer-mode", choices=("data", "8bitmime", "bdat", "binarymime"), default=None,
+                        help="Message transfer mode, overriding the scenario (see README)")
+    parser.add_argument("--bdat-chunk-size", type=str, default=None,
+                        help="Bytes per BDAT chunk, e.g. 262144 or 256KB, overriding the scenario")
+    parser.add_argument("--target-rate", type=float, default=None,
+                        help="Send on an open-loop schedule at this rate (emails/second), overriding the scenario")
+    parser.add_argument("--progress-interval", type=float, default=1.0, help="Seconds between progress lines")
+    parser.add_argument("--quiet", action="store_true", help="Do not print live progress")
+    parser.add_argument("--max-failure-rate", type=float, default=None,
+                        help="Exit with code 2 if more than this percentage of emails failed")
+    parser.add_argument("--fail-on-saturation", action="store_true",
+                        help="Exit with code 3 if the load generator itself was saturated during the run")
+    return parser.parse_args(argv)
+
+
+async def report_progress(sender: Any, total: int, interval: float) -> None:
+    """Print sent/failed counts and the current rate to stderr until cancelled"""
+    started = time.monotonic()
+    interactive = sys.stderr.isatty()
+    last_count, last_time = 0, started
+    failed = 0
+    while True:
+        await asyncio.sleep(interval)
+        now = time.monotonic()
+        count = len(sender.results)
+        failed += sum(1 for result in sender.results[last_count:count] if result.get('status') != 'success')
+        rate = (count - last_count) / (now - last_time) if now > last_time else 0.0
+        last_count, last_time = count, now
+        line = (f"[{now - started:7.1f}s] {count}/{total} sent "
+                f"({count / total * 100 if total else 100:5.1f}%), "
+                f"{failed} failed, {rate:8.1f} emails/s")
+        if interactive:
+            sys.stderr.write("\r" + line)
+        else:
+            sys.stderr.write(line + "\n")
+        sys.stderr.flush()
+
+
+def format_summary(stats: Dict[str, Any]) -> str:
+    latency = stats.get('latency_percentiles', {})
+    corrected = stats.get('corrected_latency_percentiles', {})
+    lines = [
+        f"Scenario:    {stats['scenario_name']}" + (" (partial)" if stats.get('partial') else ""),
+        f"Emails:      {stats['total_emails']} total, {stats['successful_emails']} successful, "
+        f"{stats['failed_emails']} failed ({stats['success_rate']:.2f}% success)",
+        f"Period:      {stats['test_start_time']} - {stats['test_end_time']}",
+        f"Throughput:  {stats['achieved_rate']:.2f} emails/s"
+        + (f", {stats['byte_rate'] / 1048576:.2f} MB/s" if 'byte_rate' in stats else ""),
+        "Latency:     avg {:.3f}s, min {:.3f}s, max {:.3f}s".format(
+            stats['avg_duration'], stats['min_duration'], stats['max_duration']),
+        "  raw        " + ", ".join(
+            f"{key} {value:.3f}s" for key, value in latency.items() if value is not None),
+        "  corrected  " + ", ".join(
+            f"{key} {value:.3f}s" for key, value in corrected.items() if value is not None)
+    ]
+    if stats.get('schedule_lag'):
+        lines.append("Start lag:   avg {:.3f}s, p99 {:.3f}s, max {:.3f}s".format(
+            stats['schedule_lag']['avg'], stats['schedule_lag']['p99'], stats['schedule_lag']['max']))
+    generator = stats.get('generator') or {}
+    if generator.get('samples'):
+        lines.append("Generator:   loop lag p99 {:.0f} ms, max {:.0f} ms, CPU avg {:.0f}%, max {:.0f}%".format(
+            generator['p99_loop_lag'] * 1000, generator['max_loop_lag'] * 1000,
+            generator['avg_cpu_percent'], generator['max_cpu_percent']))
+        if generator['saturated']:
+            lines.append("WARNING:     the load generator was saturated, latency and throughput reflect it "
+                         "rather than the SMTP server")
+        for warning in generator['warnings']:
+            lines.append(f"  {warning}")
+    if stats.get('error_categories'):
+        lines.append("Errors:")
+        for category, count in sorted(stats['error_categories'].items(), key=lambda item: -item[1]):
+            lines.append(f"  {category}: {count}")
+    if len(stats.get('targets', {})) > 1:
+        lines.append("Targets:")
+        for target, target_stats in stats['targets'].items():
+            lines.append(f"  {target}: {target_stats['total_emails']} emails, "
+                         f"{target_stats['success_rate']:.2f}% success, p95 {target_stats['p95_duration']:.3f}s")
+    modes = stats.get('transfer_modes', {})
+    if len(modes) > 1 or (modes and 'data' not in modes):
+        lines.append("Transfer modes:")
+        for mode, mode_stats in modes.items():
+            lines.append(f"  {mode}: {mode_stats['total_emails']} emails, avg {mode_stats['avg_message_size'] / 1024:.1f} KB, "
+                         f"{mode_stats['transfer_rate'] / 1048576:.2f} MB/s per connection, p95 {mode_stats['p95_duration']:.3f}s")
+    if len(stats.get('templates', {})) > 1:
+        lines.append("Templates:")
+        for template, template_stats in stats['templates'].items():
+            lines.append(f"  {template}: {template_stats['total_emails']} emails ({template_stats['share']:.1f}%), "
+                         f"{template_stats['success_rate']:.2f}% success, p95 {template_stats['p95_duration']:.3f}s")
+    return "\n".join(lines)
+
+
+async def run(args: argparse.Namespace) -> int:
+    from .src.core.scenario import TestScenario
+    from .src.core.scheduler import RateLimiter
+    from .src.core.sender import SMTPSender
+    from .src.core.report_store import check_compression
+    from .src.core.attachments import AttachmentStore
+
+    try:
+        scenario = TestScenario.from_json(args.scenario)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        print(f"Cannot load scenario {args.scenario}: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    if args.target_rate is not None:
+        if args.target_rate <= 0:
+            print("--target-rate must be positive", file=sys.stderr)
+            return EXIT_ERROR
+        scenario.target_rate = args.target_rate
+    if args.transfer_mode:
+        scenario.smtp_config.transfer_mode = args.transfer_mode
+    if args.bdat_chunk_size is not None:
+        from .src.core.payload import parse_size
+        try:
+            scenario.smtp_config.bdat_chunk_size = parse_size(args.bdat_chunk_size)
+        except ValueError as e:
+            print(f"--bdat-chunk-size: {e}", file=sys.stderr)
+            return EXIT_ERROR
+        if scenario.smtp_config.bdat_chunk_size <= 0:
+            print("--bdat-chunk-size must be positive", file=sys.stderr)
+            return EXIT_ERROR
+    try:
+        # Fail before sending anything, not after the run
+        check_compression(args.compression)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return EXIT_ERROR
+
+    sender = SMTPSender(
+        scenario,
+        rate_limiter=RateLimiter(args.max_rate) if args.max_rate else None,
+        timeout_settings={"connect_timeout": args.connect_timeout, "send_timeout": args.send_timeout},
+        attachment_store=AttachmentStore(args.attachment_dir)
+    )
+    total = scenario.num_threads * scenario.emails_per_thread
+    progress = None
+    if not args.quiet:
+        progress = asyncio.create_task(report_progress(sender, total, args.progress_interval))
+
+    interrupted = False
+    try:
+        await sender.run_test()
+    except asyncio.CancelledError:
+        # Ctrl+C: summarize what was sent so far
+        interrupted = True
+    finally:
+        if progress:
+            progress.cancel()
+            await asyncio.gather(progress, return_exceptions=True)
+            sys.stderr.write("\n")
+
+    results = sender.results
+    if not results:
+        print("No emails were sent", file=sys.stderr)
+        return EXIT_INTERRUPTED if interrupted else EXIT_ERROR
+
+    from .src.core.reporter import TestReporter
+    reporter = TestReporter(scenario.name, results, partial=interrupted,
+                            window_seconds=scenario.report_window_seconds, generator=sender.monitor.to_dict())
+    stats = reporter.generate_statistics()
+
+    output_dir = args.output_dir or (Path("reports") if args.format == "html" else None)
+    if output_dir:
+        print(f"JSON report: {reporter.save_json_report(output_dir, compression=args.compression, stats=stats)}", file=sys.stderr)
+    if args.format == "html":
+        template_dir = Path(__file__).resolve().parent / "templates"
+        print(f"HTML report: {reporter.generate_html_report(template_dir, output_dir, stats=stats)}", file=sys.stderr)
+
+    if args.format == "json":
+        print(json.dumps(stats, indent=4))
+    else:
+        print(format_summary(stats))
+
+    if interrupted:
+        return EXIT_INTERRUPTED
+    if args.fail_on_saturation and stats['generator']['saturated']:
+        return EXIT_GENERATOR_SATURATED
+    if args.max_failure_rate is not None and 100 - stats['success_rate'] > args.max_failure_rate:
+        return EXIT_FAILURE_RATE
+    return EXIT_OK
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    try:
+        return asyncio.run(run(args))
+    except KeyboardInterrupt:
+        # run() already printed the partial summary
+        return EXIT_INTERRUPTED
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,20 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks, Request, Body
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request, Body
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import FileResponse, HTMLResponse, JSONResponse
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, StreamingResponse
 from pathlib import Path
 import asyncio
 import json
-from typing import List, Dict, Any, Optional
+from typing import AsyncIterator, List, Dict, Any, Optional
 import aiofiles
-from datetime import datetime
 
-from ..core import TestScenario, SMTPSender, TestReporter, ScenarioMetadata
+from ..core import TestScenario, SMTPSender, ScenarioMetadata, RunScheduler, RunStatus, TestRun, RateLimiter, RunCheckpoint
+from ..core.control import RunControl
+from ..core.attachments import CHUNK_SIZE, AttachmentStore, is_attachment_ref, ref_digest
+from ..core.report_worker import ReportJob, ReportWorker, read_progress
+from ..core.comparison import RegressionThresholds, compare_reports, find_scenario_reports, load_report_statistics
+from ..core.report_store import (ReportSettings, apply_retention, content_encoding, find_json_report,
+                                 iter_report_bytes, read_report_statistics, report_base_name, report_groups)
 
 # Get the absolute path to the project root and template directories
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
@@ -17,6 +22,8 @@ TEMPLATE_DIR = BASE_DIR / "templates"
 STATIC_DIR = BASE_DIR / "static"
 SCENARIOS_DIR = BASE_DIR / "scenarios"
 REPORTS_DIR = BASE_DIR / "reports"  # This is inside smtp_stress_test/reports
+RUNS_DIR = SCENARIOS_DIR / "runs"
+REPORT_SETTINGS_PATH = SCENARIOS_DIR / "settings" / "reports.json"
 
 # Create necessary directories
 TEMPLATE_DIR.mkdir(exist_ok=True)
@@ -48,38 +55,221 @@ timeout_settings = {
     "send_timeout": 1.0
 }
 
-# Store running tests
-active_tests: Dict[str, asyncio.Task] = {}
-
-async def run_test_scenario(scenario: TestScenario) -> None:
+# Report compression and retention, persisted across restarts
+report_settings = ReportSettings.load(REPORT_SETTINGS_PATH)
+
+# Uploaded attachments, stored once per content and shared between scenarios
+attachment_store = AttachmentStore(SCENARIOS_DIR / "attachments")
+
+async def generate_reports(run_id: str, scenario_name: str, partial: bool = False,
+                           window_seconds: float = 1.0,
+                           generator: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, str]]:
+    """Build the JSON and HTML reports of a run from its checkpoint and return their URLs.
+
+    The reports are built in the report worker process; its progress is shown by /tests/status.
+    """
+    files = await report_worker.build(ReportJob(
+        scenario_name=scenario_name,
+        run_id=run_id,
+        checkpoint_dir=scheduler.checkpoint_dir(run_id),
+        output_dir=REPORTS_DIR,
+        template_dir=TEMPLATE_DIR,
+        partial=partial,
+        window_seconds=window_seconds,
+        compression=report_settings.compression,
+        generator=generator
+    ))
+    if not files:
+        return None
+    print(f"Reports generated successfully: JSON={files['json']}, HTML={files['html']}")
+    return {
+        "name": scenario_name,
+        "html": f"/reports/{files['html']}",
+        "json": f"/reports/{files['json']}"
+    }
+
+async def run_test_scenario(run: TestRun, rate_limiter: RateLimiter) -> Optional[Dict[str, Any]]:
+    """Execute one scheduled run and return the URLs of its reports"""
+    scenario_path = SCENARIOS_DIR / f"{run.scenario_name}.json"
+    if not scenario_path.exists():
+        raise Exception(f"Scenario not found: {run.scenario_name}")
+    scenario = TestScenario.from_json(scenario_path)
     try:
         # Update scenario metadata before running test
         metadata = ScenarioMetadata(scenario.name)
         metadata.update_run()
         
-        sender = SMTPSender(scenario)
+        checkpoint = RunCheckpoint(scheduler.checkpoint_dir(run.run_id))
+        if run.resume_from:
+            previous = RunCheckpoint(scheduler.checkpoint_dir(run.resume_from))
+            if not previous.exists():
+                raise Exception(f"No checkpoint found for run {run.resume_from}")
+            checkpoint.copy_from(previous)
+        
+        control = RunControl(run.concurrency, scenario.target_rate, timeout_settings)
+        sender = SMTPSender(scenario, rate_limiter=rate_limiter, checkpoint=checkpoint, control=control,
+                            attachment_store=attachment_store)
+        run_controls[run.run_id] = control
         try:
-            results = await sender.run_test()
-            
-            # Generate reports only if test wasn't cancelled
-            reporter = TestReporter(scenario.name, results)
+            await sender.run_test()
+        except asyncio.CancelledError:
+            print(f"Test cancelled for scenario: {scenario.name} (run {run.run_id})")
+            # Stopped runs still get a report of everything sent so far
             try:
-                json_report = reporter.save_json_report(REPORTS_DIR)
-                html_report = reporter.generate_html_report(TEMPLATE_DIR, REPORTS_DIR)
-                print(f"Reports generated successfully: JSON={json_report}, HTML={html_report}")
+                scheduler.set_phase(run, 'reporting')
+                scheduler.set_report(run, await generate_reports(
+                    run.run_id, scenario.name, partial=True, window_seconds=scenario.report_window_seconds,
+                    generator=sender.monitor.to_dict()
+                ))
             except Exception as report_error:
-                print(f"Error generating reports: {str(report_error)}")
-                raise Exception(f"Test completed but report generation failed: {str(report_error)}")
-        except asyncio.CancelledError:
-            print(f"Test cancelled for scenario: {scenario.name}")
+                print(f"Error generating partial reports: {str(report_error)}")
             raise
+        finally:
+            run_controls.pop(run.run_id, None)
+            
+        # Every result is in the checkpoint now; the report worker reads it from there
+        scheduler.set_phase(run, 'reporting')
+        try:
+            report = await generate_reports(run.run_id, scenario.name, window_seconds=scenario.report_window_seconds,
+                                            generator=sender.monitor.to_dict())
+        except Exception as report_error:
+            print(f"Error generating reports: {str(report_error)}")
+            raise Exception(f"Test completed but report generation failed: {str(report_error)}")
+
+        if report and scenario.regression_thresholds:
+            report['regression'] = await asyncio.to_thread(check_regression, scenario, report)
+        retention_wakeup.set()
+        return report
             
     except Exception as e:
         print(f"Error in run_test_scenario: {str(e)}")
         raise e
-    finally:
-        if scenario.name in active_tests:
-            del active_tests[scenario.name]
+
+def check_regression(scenario: TestScenario, report: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Compare a finished run with the previous complete run of the same scenario"""
+    try:
+        thresholds = RegressionThresholds.from_dict(scenario.regression_thresholds)
+        current = Path(report['json']).name
+        # Oldest first by time, then write order; names of runs ending in the same
+        # second differ only in their random run IDs, so they cannot be compared
+        reports = find_scenario_reports(REPORTS_DIR, scenario.name)
+        position = next((i for i, path in enumerate(reports) if path.name == current), None)
+        if position is None:
+            return None
+        baseline = None
+        for path in reversed(reports[:position]):
+            stats = load_report_statistics(path)
+            # A run limited by its own generator is no baseline
+            if not stats.get('partial') and not (stats.get('generator') or {}).get('saturated'):
+                baseline = (path.name, stats)
+                break
+        if baseline is None:
+            return None
+        comparison = compare_reports([baseline, (current, load_report_statistics(REPORTS_DIR / current))], thresholds)
+        return {
+            'baseline': comparison['baseline'],
+            'verdict': comparison['verdict'],
+            'regressions': comparison['comparisons'][0]['regressions']
+        }
+    except Exception as e:
+        print(f"Regression check failed for scenario {scenario.name}: {e}")
+        return None
+
+async def recover_interrupted_runs() -> None:
+    """Build partial reports from the checkpoints of runs cut off by a crash or restart"""
+    for run in list(scheduler.runs.values()):
+        if run.status != RunStatus.INTERRUPTED or run.report:
+            continue
+        checkpoint = RunCheckpoint(scheduler.checkpoint_dir(run.run_id))
+        if not checkpoint.exists():
+            continue
+        try:
+            window_seconds = 1.0
+            scenario_path = SCENARIOS_DIR / f"{run.scenario_name}.json"
+            if scenario_path.exists():
+                # The scenario may have been deleted since; its windows are only a presentation setting
+                window_seconds = TestScenario.from_json(scenario_path).report_window_seconds
+            scheduler.set_report(run, await generate_reports(run.run_id, run.scenario_name, partial=True,
+                                                             window_seconds=window_seconds))
+        except Exception as e:
+            print(f"Failed to build partial report for run {run.run_id}: {e}")
+
+async def enforce_report_retention() -> None:
+    """Apply the report retention policy every cleanup interval and after each new report"""
+    while True:
+        retention_wakeup.clear()
+        try:
+            removed = await asyncio.to_thread(apply_retention, REPORTS_DIR, report_settings)
+            if removed:
+                print(f"Report retention removed {len(removed)} report(s): {', '.join(g.name for g in removed)}")
+        except Exception as e:
+            print(f"Report retention failed: {e}")
+        try:
+            await asyncio.wait_for(retention_wakeup.wait(), report_settings.cleanup_interval_minutes * 60)
+        except asyncio.TimeoutError:
+            pass
+
+# Run queue shared by every test started through the API
+scheduler = RunScheduler(RUNS_DIR / "runs.json", run_test_scenario)
+# Live settings of the runs currently executing, by run ID
+run_controls: Dict[str, RunControl] = {}
+# Process that builds reports, off the event loop shared by the API and running tests
+report_worker = ReportWorker()
+retention_task: Optional[asyncio.Task] = None
+retention_wakeup = asyncio.Event()
+
+@app.on_event("startup")
+async def start_scheduler():
+    global retention_task
+    scheduler.start()
+    asyncio.create_task(recover_interrupted_runs())
+    retention_task = asyncio.create_task(enforce_report_retention())
+    try:
+        # Uploads of scenarios that were never saved
+        await asyncio.to_thread(attachment_store.prune)
+    except Exception as e:
+        print(f"Attachment cleanup failed: {e}")
+
+@app.on_event("shutdown")
+async def stop_scheduler():
+    await scheduler.shutdown()
+    await asyncio.to_thread(report_worker.shutdown)
+
+def submit_run(scenario_name: str, priority: int = 0) -> TestRun:
+    scenario_path = SCENARIOS_DIR / f"{scenario_name}.json"
+    if not scenario_path.exists():
+        raise HTTPException(status_code=404, detail="Scenario not found")
+    
+    try:
+        scenario = TestScenario.from_json(scenario_path)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid scenario: {str(e)}")
+    return scheduler.submit(scenario.name, priority=priority, concurrency=scenario.num_threads)
+
+def scenario_attachments(scenario_data: Dict[str, Any]) -> List[str]:
+    """Attachments of the email template and of every traffic mix entry"""
+    attachments = list((scenario_data.get('email_template') or {}).get('attachments') or [])
+    for entry in scenario_data.get('traffic_mix') or []:
+        attachments.extend(entry.get('attachments') or [])
+    return attachments
+
+def track_attachments(scenario_name: str, scenario_data: Dict[str, Any]) -> None:
+    """Record which stored attachments a scenario uses, releasing the ones it dropped"""
+    try:
+        attachment_store.set_references(scenario_name, scenario_attachments(scenario_data))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def delete_scenario_attachments(scenario_name: str, scenario_data: Dict[str, Any]) -> None:
+    attachment_store.set_references(scenario_name, [])
+    # Attachments of older scenarios are plain files owned by the scenario
+    for attachment_path in scenario_attachments(scenario_data):
+        if is_attachment_ref(attachment_path):
+            continue
+        try:
+            Path(attachment_path).unlink(missing_ok=True)
+        except Exception as e:
+            print(f"Failed to delete attachment {attachment_path}: {e}")
 
 @app.post("/scenarios/upload")
 async def upload_scenario(file: UploadFile = File(...)):
@@ -91,6 +281,7 @@ async def upload_scenario(file: UploadFile = File(...)):
     
     # Save scenario to scenarios directory
     scenario_path = SCENARIOS_DIR / file.filename
+    track_attachments(scenario_path.stem, scenario_data)
     async with aiofiles.open(scenario_path, 'wb') as f:
         await f.write(content)
     
@@ -105,6 +296,7 @@ async def create_scenario(scenario_data: dict = Body(...)):
     if scenario_path.exists():
         raise HTTPException(status_code=400, detail="Scenario with this name already exists")
     
+    track_attachments(scenario_data['name'], scenario_data)
     async with aiofiles.open(scenario_path, 'w') as f:
         await f.write(json.dumps(scenario_data, indent=4))
     
@@ -119,6 +311,7 @@ async def update_scenario(scenario_name: str, scenario_data: dict = Body(...)):
     if not scenario_path.exists():
         raise HTTPException(status_code=404, detail="Scenario not found")
     
+    track_attachments(scenario_name, scenario_data)
     async with aiofiles.open(scenario_path, 'w') as f:
         await f.write(json.dumps(scenario_data, indent=4))
     
@@ -135,13 +328,8 @@ async def delete_scenario(scenario_name: str):
         content = await f.read()
         scenario_data = json.loads(content)
         
-    # Delete attachments if they exist
-    if 'email_template' in scenario_data and 'attachments' in scenario_data['email_template']:
-        for attachment_path in scenario_data['email_template']['attachments']:
-            try:
-                Path(attachment_path).unlink(missing_ok=True)
-            except Exception as e:
-                print(f"Failed to delete attachment {attachment_path}: {e}")
+    # Release attachments; shared ones stay until their last scenario is gone
+    delete_scenario_attachments(scenario_name, scenario_data)
     
     # Delete metadata file if exists
     metadata_path = SCENARIOS_DIR / "metadata" / f"{scenario_name}.metadata.json"
@@ -183,122 +371,173 @@ async def list_scenarios():
     return scenarios
 
 @app.post("/tests/start/{scenario_name}")
-async def start_test(scenario_name: str, background_tasks: BackgroundTasks):
-    scenario_path = SCENARIOS_DIR / f"{scenario_name}.json"
-    
-    if not scenario_path.exists():
-        raise HTTPException(status_code=404, detail="Scenario not found")
-    
-    try:
-        scenario = TestScenario.from_json(scenario_path)
-        task = asyncio.create_task(run_test_scenario(scenario))
-        active_tests[scenario.name] = task
-        
-        return {"message": f"Test started for scenario: {scenario_name}"}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def start_test(scenario_name: str, priority: int = 0):
+    run = submit_run(scenario_name, priority)
+    return {
+        "message": f"Test queued for scenario: {scenario_name}",
+        **scheduler.describe(run)
+    }
 
 @app.post("/tests/stop/{scenario_name}")
 async def stop_test(scenario_name: str):
-    if scenario_name in active_tests:
-        task = active_tests[scenario_name]
-        task.cancel()
-        try:
-            await task
-        except asyncio.CancelledError:
-            pass
-        del active_tests[scenario_name]
-        return {"message": f"Test stopped for scenario: {scenario_name}"}
-    raise HTTPException(status_code=404, detail="No running test found for this scenario")
+    runs = [
+        run for run in list(scheduler.runs.values())
+        if run.scenario_name == scenario_name and run.status in (RunStatus.QUEUED, RunStatus.RUNNING)
+    ]
+    if not runs:
+        raise HTTPException(status_code=404, detail="No running test found for this scenario")
+    await scheduler.cancel_runs([run.run_id for run in runs])
+    return {"message": f"Test stopped for scenario: {scenario_name}"}
 
 @app.post("/scenarios/stop")
 async def stop_scenarios():
-    """Stop all running test scenarios"""
-    for test_id, task in active_tests.items():
-        if not task.done():
-            task.cancel()
-    active_tests.clear()
+    """Stop all running and queued test scenarios"""
+    await scheduler.cancel_runs([
+        run.run_id for run in scheduler.runs.values()
+        if run.status in (RunStatus.QUEUED, RunStatus.RUNNING)
+    ])
     return {"message": "All running tests have been stopped"}
 
 @app.get("/tests/status/{scenario_name}")
 async def get_test_status(scenario_name: str):
-    # Check if the test is currently running
-    if scenario_name in active_tests:
-        task = active_tests[scenario_name]
-        if task.done():
-            if task.exception():
-                error = str(task.exception())
-                del active_tests[scenario_name]
-                return {"status": "error", "error": error}
-            
-            del active_tests[scenario_name]
-            
-            # Check if there's a report
-            report_pattern = f"report_{scenario_name}_*.json"
-            reports = list(REPORTS_DIR.glob(report_pattern))
-            if reports:
-                # Get the latest report
-                latest_report = sorted(reports, key=lambda x: x.stat().st_mtime, reverse=True)[0]
-                return {
-                    "status": "completed",
-                    "report": {
-                        "name": scenario_name,
-                        "html": f"/reports/{latest_report.stem}.html",
-                        "json": f"/reports/{latest_report.stem}.json"
-                    }
-                }
-            return {"status": "completed", "error": "Report not found"}
-        return {"status": "running"}
+    run = scheduler.latest_run(scenario_name)
+    if run is not None:
+        if run.status == RunStatus.QUEUED:
+            return {"status": "queued", "run_id": run.run_id, "queue_position": scheduler.queue_position(run.run_id)}
+        if run.status == RunStatus.RUNNING:
+            control = run_controls.get(run.run_id)
+            status = {"status": "running", "run_id": run.run_id, "paused": bool(control and control.paused),
+                      "phase": run.phase}
+            if run.phase == 'reporting':
+                status["report_progress"] = read_progress(scheduler.checkpoint_dir(run.run_id))
+            return status
+        if run.status == RunStatus.FAILED:
+            return {"status": "error", "run_id": run.run_id, "error": run.error}
+        if run.status in (RunStatus.CANCELLED, RunStatus.INTERRUPTED):
+            return {"status": "stopped", "run_id": run.run_id, "report": run.report}
+        if run.report:
+            return {"status": "completed", "run_id": run.run_id, "report": run.report}
     
     # Check if there's a report for a completed test
-    report_pattern = f"report_{scenario_name}_*.json"
-    reports = list(REPORTS_DIR.glob(report_pattern))
+    reports = find_scenario_reports(REPORTS_DIR, scenario_name)
     if reports:
         # Get the latest report
-        latest_report = sorted(reports, key=lambda x: x.stat().st_mtime, reverse=True)[0]
+        latest_report = reports[-1]
         return {
             "status": "completed",
             "report": {
                 "name": scenario_name,
-                "html": f"/reports/{latest_report.stem}.html",
-                "json": f"/reports/{latest_report.stem}.json"
+                "html": f"/reports/{report_base_name(latest_report.name)}.html",
+                "json": f"/reports/{latest_report.name}"
             }
         }
     
     return {"status": "not_found"}
 
+@app.post("/runs")
+async def create_run(request_data: dict = Body(...)):
+    """Queue a run; higher priority runs start first"""
+    if not request_data.get("scenario_name"):
+        raise HTTPException(status_code=400, detail="scenario_name is required")
+    run = submit_run(request_data["scenario_name"], int(request_data.get("priority", 0)))
+    return scheduler.describe(run)
+
+@app.get("/runs")
+async def list_runs():
+    runs = sorted(scheduler.runs.values(), key=lambda run: run.queued_at, reverse=True)
+    return [scheduler.describe(run) for run in runs]
+
+@app.get("/runs/{run_id}")
+async def get_run(run_id: str):
+    run = scheduler.get(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    return scheduler.describe(run)
+
+@app.post("/runs/{run_id}/resume")
+async def resume_run(run_id: str):
+    """Queue a new run that continues a stopped or interrupted run from its last checkpoint"""
+    previous = scheduler.get(run_id)
+    if previous is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    if previous.status not in (RunStatus.CANCELLED, RunStatus.INTERRUPTED, RunStatus.FAILED):
+        raise HTTPException(status_code=400, detail=f"Run is {previous.status}, only stopped or interrupted runs can be resumed")
+    if not RunCheckpoint(scheduler.checkpoint_dir(run_id)).exists():
+        raise HTTPException(status_code=400, detail="Run has no checkpoint to resume from")
+    
+    scenario_path = SCENARIOS_DIR / f"{previous.scenario_name}.json"
+    if not scenario_path.exists():
+        raise HTTPException(status_code=404, detail="Scenario not found")
+    run = scheduler.submit(
+        previous.scenario_name,
+        priority=previous.priority,
+        concurrency=previous.concurrency,
+        resume_from=run_id
+    )
+    return scheduler.describe(run)
+
+@app.get("/runs/{run_id}/control")
+async def get_run_control(run_id: str):
+    control = run_controls.get(run_id)
+    if control is None:
+        raise HTTPException(status_code=404, detail="Run is not running")
+    return control.to_dict()
+
+@app.post("/runs/{run_id}/control")
+async def update_run_control(run_id: str, changes: dict = Body(...)):
+    """Change target_rate, concurrency, paused, connect_timeout or send_timeout of a running run"""
+    run = scheduler.get(run_id)
+    control = run_controls.get(run_id)
+    if run is None or control is None:
+        raise HTTPException(status_code=404, detail="Run is not running")
+    try:
+        annotation = control.apply(changes)
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if annotation and 'concurrency' in annotation['changes']:
+        # The global connection budget follows the new concurrency
+        scheduler.set_concurrency(run, control.concurrency)
+    return {
+        "message": "Run control updated" if annotation else "Nothing changed",
+        "change": annotation,
+        "control": control.to_dict()
+    }
+
+@app.delete("/runs/{run_id}")
+async def cancel_run(run_id: str):
+    if scheduler.get(run_id) is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    run = await scheduler.cancel(run_id)
+    return scheduler.describe(run)
+
 @app.get("/reports")
 async def list_reports():
     reports = []
     try:
-        for report_file in REPORTS_DIR.glob("report_*.html"):
-            # Extract the scenario name from the report filename
-            name_parts = report_file.stem.split('_')
-            if len(name_parts) >= 3:  # ["report", "scenario_name", "timestamp"]
-                scenario_name = '_'.join(name_parts[1:-1])
-            else:
-                scenario_name = report_file.stem
+        for group in report_groups(REPORTS_DIR):
+            html_file = REPORTS_DIR / f"{group.name}.html"
+            if not html_file.exists():
+                continue
                 
-            # Check if corresponding JSON exists
-            json_file = report_file.with_suffix('.json')
-            if json_file.exists():
+            # Success rate from the statistics line of the JSON report (plain or compressed)
+            json_file = group.json_path
+            success_rate = None
+            if json_file:
                 try:
-                    with open(json_file, 'r') as f:
-                        report_data = json.load(f)
-                        success_rate = report_data.get('statistics', {}).get('success_rate', 0)
+                    stats = await asyncio.to_thread(read_report_statistics, json_file)
+                    success_rate = stats.get('success_rate', 0)
                 except Exception as e:
                     print(f"Error reading JSON report {json_file}: {e}")
-                    success_rate = None
-            else:
-                success_rate = None
                 
             reports.append({
-                "name": scenario_name,
-                "filename": report_file.name,
-                "html_url": f"/reports/{report_file.name}",
-                "json_url": f"/reports/{report_file.stem}.json",
-                "created": report_file.stat().st_mtime,
-                "success_rate": success_rate
+                "name": group.scenario_name,
+                "run_id": group.run_id,
+                "filename": html_file.name,
+                "html_url": f"/reports/{html_file.name}",
+                "json_url": f"/reports/{json_file.name if json_file else group.name + '.json'}",
+                "created": html_file.stat().st_mtime,
+                "success_rate": success_rate,
+                "size": group.size
             })
     except Exception as e:
         print(f"Error listing reports: {e}")
@@ -306,30 +545,97 @@ async def list_reports():
     return sorted(reports, key=lambda x: x["created"], reverse=True)
 
 @app.get("/reports/{report_name}")
-async def get_report(report_name: str):
+async def get_report(report_name: str, request: Request):
     # First try with the exact name
+    report_name = Path(report_name).name
     report_path = REPORTS_DIR / report_name
     
-    # If not found, try appending extensions
+    # If not found, try the other extensions and compressions
     if not report_path.exists():
         if report_name.endswith('.html'):
             report_path = REPORTS_DIR / report_name
-        elif report_name.endswith('.json'):
-            report_path = REPORTS_DIR / report_name
+        elif '.json' in report_name:
+            report_path = find_json_report(REPORTS_DIR, report_base_name(report_name)) or report_path
         else:
             # Try to find any report file matching this name
             html_path = REPORTS_DIR / f"{report_name}.html"
-            json_path = REPORTS_DIR / f"{report_name}.json"
             if html_path.exists():
                 report_path = html_path
-            elif json_path.exists():
-                report_path = json_path
+            else:
+                report_path = find_json_report(REPORTS_DIR, report_name) or report_path
     
     if not report_path.exists():
         raise HTTPException(status_code=404, detail="Report not found")
     
+    # Compressed reports are sent as they are when the client can decode them
+    encoding = content_encoding(report_path)
+    if encoding:
+        accepted = [value.split(';')[0].strip() for value in request.headers.get('accept-encoding', '').split(',')]
+        if encoding in accepted:
+            return FileResponse(report_path, media_type="application/json",
+                                headers={"Content-Encoding": encoding, "Vary": "Accept-Encoding"})
+        return StreamingResponse(iter_report_bytes(report_path), media_type="application/json",
+                                 headers={"Vary": "Accept-Encoding"})
     return FileResponse(report_path)
 
+@app.delete("/reports/{report_name}")
+async def delete_report(report_name: str):
+    """Delete the HTML and JSON files of one report"""
+    base_name = report_base_name(report_name)
+    for group in report_groups(REPORTS_DIR):
+        if group.name == base_name:
+            group.remove()
+            return {"message": f"Riport sikeresen törölve: {base_name}"}
+    raise HTTPException(status_code=404, detail="Report not found")
+
+def report_json_path(report_name: str) -> Path:
+    """JSON report for a report name given with or without its .html/.json extension"""
+    report_path = find_json_report(REPORTS_DIR, report_base_name(report_name))
+    if report_path is None:
+        raise HTTPException(status_code=404, detail=f"Report not found: {report_name}")
+    return report_path
+
+@app.post("/reports/compare")
+async def compare_report_files(request_data: dict = Body(...)):
+    """Compare runs against the first report given: throughput, latency percentiles and error mix"""
+    names = request_data.get("reports") or []
+    if len(names) < 2:
+        raise HTTPException(status_code=400, detail="At least two reports are needed for a comparison")
+    try:
+        thresholds = RegressionThresholds.from_dict(request_data.get("thresholds"))
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    paths = [report_json_path(name) for name in names]
+    reports = [(path.name, await asyncio.to_thread(load_report_statistics, path)) for path in paths]
+    return compare_reports(reports, thresholds)
+
+@app.get("/scenarios/{scenario_name}/compare")
+async def compare_scenario_runs(scenario_name: str, last: int = 2, include_partial: bool = False):
+    """Compare the last N reports of a scenario, oldest as baseline, using the scenario's thresholds"""
+    if last < 2:
+        raise HTTPException(status_code=400, detail="At least two reports are needed for a comparison")
+    reports = []
+    for path in reversed(find_scenario_reports(REPORTS_DIR, scenario_name)):
+        stats = await asyncio.to_thread(load_report_statistics, path)
+        if stats.get('partial') and not include_partial:
+            continue
+        reports.insert(0, (path.name, stats))
+        if len(reports) == last:
+            break
+    if len(reports) < 2:
+        raise HTTPException(status_code=404, detail="Not enough reports to compare for this scenario")
+
+    thresholds_data = None
+    scenario_path = SCENARIOS_DIR / f"{scenario_name}.json"
+    if scenario_path.exists():
+        thresholds_data = TestScenario.from_json(scenario_path).regression_thresholds
+    try:
+        thresholds = RegressionThresholds.from_dict(thresholds_data)
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid regression thresholds in scenario: {e}")
+    return compare_reports(reports, thresholds)
+
 @app.delete("/reports")
 async def delete_all_reports():
     try:
@@ -340,25 +646,43 @@ async def delete_all_reports():
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Hiba történt a riportok törlése során: {str(e)}")
 
+async def upload_chunks(file: UploadFile) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await file.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
 @app.post("/scenarios/upload-attachments")
 async def upload_attachments(files: List[UploadFile] = File(...)):
-    attachment_paths = []
-    attachment_dir = SCENARIOS_DIR / "attachments"
-    attachment_dir.mkdir(exist_ok=True)
-    
+    """Store uploaded attachments; scenarios refer to them by the returned sha256 references"""
+    attachments = []
     for file in files:
-        # Generate a unique filename to avoid conflicts
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_filename = f"{timestamp}_{file.filename}"
-        file_path = attachment_dir / safe_filename
-        
-        content = await file.read()
-        async with aiofiles.open(file_path, 'wb') as f:
-            await f.write(content)
-        
-        attachment_paths.append(str(file_path))
-    
-    return {"paths": attachment_paths}
+        attachments.append(await attachment_store.store_stream(upload_chunks(file), file.filename))
+    return {"paths": [attachment['ref'] for attachment in attachments], "attachments": attachments}
+
+@app.put("/attachments/{filename}")
+async def put_attachment(filename: str, request: Request):
+    """Store the raw request body as an attachment, streamed without a temporary upload file"""
+    return await attachment_store.store_stream(request.stream(), filename)
+
+@app.get("/attachments")
+async def list_attachments():
+    return attachment_store.entries()
+
+@app.delete("/attachments/{ref}")
+async def delete_attachment(ref: str):
+    try:
+        ref_digest(ref)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        attachment_store.remove(ref)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"message": f"Attachment deleted: {ref}"}
 
 @app.delete("/scenarios")
 async def delete_all_scenarios():
@@ -371,13 +695,8 @@ async def delete_all_scenarios():
                 content = await f.read()
                 scenario_data = json.loads(content)
                 
-            # Delete attachments if they exist
-            if 'email_template' in scenario_data and 'attachments' in scenario_data['email_template']:
-                for attachment_path in scenario_data['email_template']['attachments']:
-                    try:
-                        Path(attachment_path).unlink(missing_ok=True)
-                    except Exception as e:
-                        print(f"Failed to delete attachment {attachment_path}: {e}")
+            # Release attachments; shared ones stay until their last scenario is gone
+            delete_scenario_attachments(scenario_name, scenario_data)
             
             # Delete metadata file if exists
             metadata_path = SCENARIOS_DIR / "metadata" / f"{scenario_name}.metadata.json"
@@ -472,3 +791,49 @@ async def update_timeout_settings(settings: dict = Body(...)):
 async def get_timeout_settings():
     """Jelenlegi timeout beállítások lekérése"""
     return timeout_settings
+
+@app.post("/settings/scheduler")
+async def update_scheduler_settings(settings: dict = Body(...)):
+    """Global budget for all running tests: total connections and emails/second (null = unlimited)"""
+    max_connections = settings.get("max_connections", scheduler.max_connections)
+    max_rate = settings.get("max_rate", scheduler.max_rate)
+    try:
+        max_connections = int(max_connections) if max_connections is not None else None
+        max_rate = float(max_rate) if max_rate is not None else None
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="max_connections and max_rate must be numbers or null")
+    # A budget of zero could never admit a run or grant a send; null is the way to lift a limit
+    if max_connections is not None and max_connections < 1:
+        raise HTTPException(status_code=400, detail="max_connections must be at least 1, or null for unlimited")
+    if max_rate is not None and max_rate <= 0:
+        raise HTTPException(status_code=400, detail="max_rate must be positive, or null for unlimited")
+    scheduler.update_budget(max_connections, max_rate)
+    return {"message": "Scheduler settings updated", "settings": await get_scheduler_settings()}
+
+@app.get("/settings/scheduler")
+async def get_scheduler_settings():
+    return {
+        "max_connections": scheduler.max_connections,
+        "max_rate": scheduler.max_rate
+    }
+
+@app.post("/settings/reports")
+async def update_report_settings(settings: dict = Body(...)):
+    """Report compression (null, "gzip", "zstd") and retention: keep_last per scenario, max_age_days, max_total_mb"""
+    global report_settings, retention_task
+    try:
+        new_settings = ReportSettings.from_dict({**report_settings.to_dict(), **settings})
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    new_settings.save(REPORT_SETTINGS_PATH)
+    report_settings = new_settings
+
+    # Restart the retention loop so the new policy applies right away
+    if retention_task:
+        retention_task.cancel()
+    retention_task = asyncio.create_task(enforce_report_retention())
+    return {"message": "Report settings updated", "settings": report_settings.to_dict()}
+
+@app.get("/settings/reports")
+async def get_report_settings():
+    return report_settings.to_dict()
@@ -1,6 +1,38 @@
-from .scenario_metadata import ScenarioMetadata
-from .scenario import TestScenario
-from .sender import SMTPSender
-from .reporter import TestReporter
+import importlib
 
-__all__ = ['ScenarioMetadata', 'TestScenario', 'SMTPSender', 'TestReporter']
+# Exports are imported on first access, so the CLI and the sender do not pay
+# for pandas/jinja2 (reporter) unless a report is actually built
+_EXPORTS = {
+    'ScenarioMetadata': '.scenario_metadata',
+    'TestScenario': '.scenario',
+    'SMTPSender': '.sender',
+    'TestReporter': '.reporter',
+    'RunScheduler': '.scheduler',
+    'RunStatus': '.scheduler',
+    'TestRun': '.scheduler',
+    'RateLimiter': '.scheduler',
+    'RunCheckpoint': '.checkpoint',
+    'RunControl': '.control',
+    'AttachmentStore': '.attachments',
+    'GeneratorMonitor': '.monitor',
+    'ReportWorker': '.report_worker',
+    'RegressionThresholds': '.comparison',
+    'compare_reports': '.comparison',
+}
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
+
+__all__ = ['ScenarioMetadata', 'TestScenario', 'SMTPSender', 'TestReporter',
+           'RunScheduler', 'RunStatus', 'TestRun', 'RateLimiter', 'RunCheckpoint',
+           'RunControl', 'AttachmentStore', 'GeneratorMonitor', 'ReportWorker', 'RegressionThresholds', 'compare_reports']
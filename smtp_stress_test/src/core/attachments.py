@@ -0,0 +1,190 @@
+import hashlib
+import json
+import mmap
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Union
+
+import aiofiles
+
+REF_PREFIX = "sha256:"
+# Bytes read, hashed and written per step of an upload
+CHUNK_SIZE = 1024 * 1024
+
+
+def is_attachment_ref(value: Union[str, Path]) -> bool:
+    return isinstance(value, str) and value.startswith(REF_PREFIX)
+
+
+def ref_digest(ref: str) -> str:
+    digest = ref[len(REF_PREFIX):] if is_attachment_ref(ref) else ''
+    if len(digest) != 64 or any(c not in '0123456789abcdef' for c in digest):
+        raise ValueError(f"Invalid attachment reference '{ref}', expected sha256:<64 hex digits>")
+    return digest
+
+
+@contextmanager
+def map_file(path: Path) -> Iterator[Union[mmap.mmap, bytes]]:
+    """Read-only memory map of a file; the pages are only loaded while they are used"""
+    with open(path, 'rb') as f:
+        if Path(path).stat().st_size == 0:
+            # Empty files cannot be mapped
+            yield b''
+            return
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield mapped
+        finally:
+            mapped.close()
+
+
+class AttachmentStore:
+    """Content-addressed attachment files: one copy per distinct content, named by its SHA-256.
+
+    Scenarios refer to attachments as "sha256:<hex>". index.json keeps the file name
+    and size of every blob and the scenarios using it; a blob is deleted when the
+    last scenario referring to it lets go.
+    """
+
+    INDEX_FILE = "index.json"
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.blob_dir = self.directory / "sha256"
+        self.index_path = self.directory / self.INDEX_FILE
+        self.index: Dict[str, Dict[str, Any]] = self._load_index()
+
+    def path(self, ref: str) -> Path:
+        digest = ref_digest(ref)
+        return self.blob_dir / digest[:2] / digest
+
+    def entry(self, ref: str) -> Optional[Dict[str, Any]]:
+        return self.index.get(ref_digest(ref))
+
+    def resolve(self, ref: str) -> tuple[Path, str]:
+        """File and original name of an attachment"""
+        entry = self.entry(ref)
+        path = self.path(ref)
+        if entry is None or not path.exists():
+            raise FileNotFoundError(f"Attachment {ref} is not in the attachment store")
+        return path, entry['name']
+
+    async def store_stream(self, chunks: AsyncIterator[bytes], name: str) -> Dict[str, Any]:
+        """Write an upload to the store while hashing it; identical content is kept once"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.directory / f".upload-{uuid.uuid4().hex}"
+        sha256 = hashlib.sha256()
+        size = 0
+        try:
+            async with aiofiles.open(tmp_path, 'wb') as f:
+                async for chunk in chunks:
+                    if not chunk:
+                        continue
+                    sha256.update(chunk)
+                    size += len(chunk)
+                    await f.write(chunk)
+            digest = sha256.hexdigest()
+            blob_path = self.blob_dir / digest[:2] / digest
+            if blob_path.exists():
+                tmp_path.unlink()
+            else:
+                blob_path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path.replace(blob_path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        entry = self.index.get(digest)
+        deduplicated = entry is not None
+        if entry is None:
+            entry = self.index[digest] = {
+                'name': Path(name).name or digest,
+                'size': size,
+                'created_at': time.time(),
+                'scenarios': []
+            }
+            self._save_index()
+        return {'ref': REF_PREFIX + digest, 'deduplicated': deduplicated, **entry}
+
+    def set_references(self, scenario_name: str, refs: List[Union[str, Path]]) -> None:
+        """Make a scenario use exactly these attachments, deleting blobs nobody uses any more.
+
+        Plain file paths (attachments of older scenarios) are ignored; an unknown
+        reference raises ValueError before anything changes.
+        """
+        digests = {ref_digest(ref) for ref in refs if is_attachment_ref(ref)}
+        unknown = [digest for digest in digests if digest not in self.index]
+        if unknown:
+            raise ValueError(f"Unknown attachments: {', '.join(REF_PREFIX + d for d in sorted(unknown))}")
+
+        changed = False
+        for digest, entry in list(self.index.items()):
+            using = scenario_name in entry['scenarios']
+            if digest in digests and not using:
+                entry['scenarios'].append(scenario_name)
+                changed = True
+            elif digest not in digests and using:
+                entry['scenarios'].remove(scenario_name)
+                changed = True
+                if not entry['scenarios']:
+                    self._remove(digest)
+        if changed:
+            self._save_index()
+
+    def remove(self, ref: str) -> None:
+        """Delete an attachment no scenario uses"""
+        digest = ref_digest(ref)
+        entry = self.index.get(digest)
+        if entry is None:
+            raise FileNotFoundError(f"Attachment {ref} is not in the attachment store")
+        if entry['scenarios']:
+            raise ValueError(f"Attachment is used by: {', '.join(entry['scenarios'])}")
+        self._remove(digest)
+        self._save_index()
+
+    def prune(self, older_than: float = 3600.0) -> List[str]:
+        """Delete uploads that no scenario took into use, and leftovers of broken uploads"""
+        cutoff = time.time() - older_than
+        removed = [
+            digest for digest, entry in self.index.items()
+            if not entry['scenarios'] and entry.get('created_at', 0) < cutoff
+        ]
+        for digest in removed:
+            self._remove(digest)
+        if removed:
+            self._save_index()
+        for tmp_path in self.directory.glob(".upload-*"):
+            if tmp_path.stat().st_mtime < cutoff:
+                tmp_path.unlink(missing_ok=True)
+        return [REF_PREFIX + digest for digest in removed]
+
+    def entries(self) -> List[Dict[str, Any]]:
+        return [{'ref': REF_PREFIX + digest, **entry} for digest, entry in self.index.items()]
+
+    def _remove(self, digest: str) -> None:
+        blob_path = self.blob_dir / digest[:2] / digest
+        blob_path.unlink(missing_ok=True)
+        try:
+            blob_path.parent.rmdir()
+        except OSError:
+            # Other blobs share the directory
+            pass
+        self.index.pop(digest, None)
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        if not self.index_path.exists():
+            return {}
+        with open(self.index_path, 'r') as f:
+            return json.load(f)
+
+    def _save_index(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.index, f, indent=4)
+        tmp_path.replace(self.index_path)
+
+
+__all__ = ['REF_PREFIX', 'CHUNK_SIZE', 'is_attachment_ref', 'ref_digest', 'map_file', 'AttachmentStore']
@@ -0,0 +1,158 @@
+import json
+import shutil
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+
+class RunCheckpoint:
+    """On-disk progress of one run: an append-only results log and aggregate state.
+
+    results.jsonl holds every finished send, state.json the running totals and one
+    summary per checkpoint window. Both are enough to build a partial report or to
+    resume the run without resending what was already sent.
+    """
+
+    RESULTS_FILE = "results.jsonl"
+    STATE_FILE = "state.json"
+
+    def __init__(self, directory: Path):
+        self.directory = Path(directory)
+        self.results_path = self.directory / self.RESULTS_FILE
+        self.state_path = self.directory / self.STATE_FILE
+        self.state: Dict[str, Any] = self._load_state()
+        # Flushes run in a worker thread while run control annotations come from the event loop
+        self._lock = threading.Lock()
+
+    def exists(self) -> bool:
+        return self.results_path.exists()
+
+    def flush(self, results: List[Dict[str, Any]]) -> None:
+        """Append newly finished results and record their window statistics"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if results:
+            with open(self.results_path, 'a') as f:
+                for result in results:
+                    f.write(json.dumps(result) + '\n')
+
+        window = _summarize(results)
+        with self._lock:
+            now = datetime.now().isoformat()
+            window['window_start'] = self.state.get('last_checkpoint') or self.state['created_at']
+            window['window_end'] = now
+            self.state['windows'].append(window)
+
+            totals = self.state['totals']
+            totals['total_emails'] += window['total_emails']
+            totals['successful_emails'] += window['successful_emails']
+            totals['failed_emails'] += window['failed_emails']
+            for category, count in window['error_categories'].items():
+                totals['error_categories'][category] = totals['error_categories'].get(category, 0) + count
+            self.state['last_checkpoint'] = now
+            self._save_state()
+
+    def add_annotation(self, annotation: Dict[str, Any]) -> None:
+        """Record a run control change so partial and resumed reports still show it"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self.state.setdefault('annotations', []).append(annotation)
+            self._save_state()
+
+    @property
+    def annotations(self) -> List[Dict[str, Any]]:
+        return self.state.get('annotations', [])
+
+    @property
+    def resumes(self) -> List[str]:
+        """When each resumed run of this checkpoint started"""
+        return self.state.get('resumes', [])
+
+    def load_results(self) -> List[Dict[str, Any]]:
+        if not self.results_path.exists():
+            return []
+        results = []
+        with open(self.results_path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    results.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Last line may be truncated if the process died while writing
+                    break
+        return results
+
+    def completed_indices(self, results: Optional[List[Dict[str, Any]]] = None) -> Dict[int, Set[int]]:
+        """(thread_id -> email indices) already attempted, which a resumed run must skip"""
+        completed: Dict[int, Set[int]] = {}
+        for result in (results if results is not None else self.load_results()):
+            if 'thread_id' in result and 'email_index' in result:
+                completed.setdefault(result['thread_id'], set()).add(result['email_index'])
+        return completed
+
+    def copy_from(self, other: 'RunCheckpoint') -> None:
+        """Start this checkpoint with the progress of an earlier run"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        if other.results_path.exists():
+            shutil.copyfile(other.results_path, self.results_path)
+        self.state = json.loads(json.dumps(other.state))
+        self.state['resumed_from'] = str(other.directory.name)
+        # Reports leave the time between the runs out of the sending time
+        self.state.setdefault('resumes', []).append(datetime.now().isoformat())
+        self._save_state()
+
+    def remove(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _load_state(self) -> Dict[str, Any]:
+        if self.state_path.exists():
+            with open(self.state_path, 'r') as f:
+                return json.load(f)
+        return {
+            'created_at': datetime.now().isoformat(),
+            'last_checkpoint': None,
+            'totals': {
+                'total_emails': 0,
+                'successful_emails': 0,
+                'failed_emails': 0,
+                'error_categories': {}
+            },
+            'windows': []
+        }
+
+    def _save_state(self) -> None:
+        tmp_path = self.state_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent=4)
+        tmp_path.replace(self.state_path)
+
+
+def _summarize(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    durations = sorted(r['duration'] for r in results if r.get('duration') is not None)
+    successful = sum(1 for r in results if r.get('status') == 'success')
+    error_categories: Dict[str, int] = {}
+    for r in results:
+        if r.get('status') != 'success':
+            category = r.get('error_category') or 'Other Error'
+            error_categories[category] = error_categories.get(category, 0) + 1
+
+    def percentile(q: float) -> Optional[float]:
+        if not durations:
+            return None
+        return durations[min(len(durations) - 1, int(q * len(durations)))]
+
+    return {
+        'total_emails': len(results),
+        'successful_emails': successful,
+        'failed_emails': len(results) - successful,
+        'avg_duration': sum(durations) / len(durations) if durations else None,
+        'p50_duration': percentile(0.50),
+        'p95_duration': percentile(0.95),
+        'p99_duration': percentile(0.99),
+        'error_categories': error_categories
+    }
+
+
+__all__ = ['RunCheckpoint']
@@ -0,0 +1,240 @@
+from dataclasses import dataclass, asdict, field, fields
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .reporter import LATENCY_PERCENTILES, percentile_key, latency_percentiles
+from .report_store import read_report, read_report_statistics, report_groups
+
+
+class Verdict:
+    PASS = "pass"
+    FAIL = "fail"
+
+
+@dataclass
+class RegressionThresholds:
+    """How far a run may fall behind its baseline before it counts as a regression.
+
+    Relative limits are percentages of the baseline value, error limits are
+    percentage points of all emails sent.
+    """
+    max_throughput_drop: float = 10.0
+    max_latency_increase: float = 20.0
+    # Per-percentile overrides of max_latency_increase, e.g. {"p99.9": 50}
+    latency_overrides: Dict[str, float] = field(default_factory=dict)
+    # Latency shifts smaller than this many seconds are treated as noise
+    min_latency_delta: float = 0.005
+    max_error_rate_increase: float = 1.0
+    max_error_category_increase: float = 1.0
+
+    @classmethod
+    def from_dict(cls, data: Optional[Dict[str, Any]]) -> 'RegressionThresholds':
+        data = dict(data or {})
+        known = {f.name for f in fields(cls)}
+        unknown = set(data) - known
+        if unknown:
+            raise ValueError(f"Unknown regression thresholds: {', '.join(sorted(unknown))}")
+
+        overrides = data.pop('latency_overrides', None) or {}
+        valid_keys = {percentile_key(q) for q in LATENCY_PERCENTILES}
+        for key in overrides:
+            if key not in valid_keys:
+                raise ValueError(f"Unknown latency percentile '{key}', expected one of: {', '.join(sorted(valid_keys))}")
+
+        thresholds = cls(**{key: float(value) for key, value in data.items()},
+                         latency_overrides={key: float(value) for key, value in overrides.items()})
+        for f in fields(cls):
+            value = getattr(thresholds, f.name)
+            if isinstance(value, float) and value < 0:
+                raise ValueError(f"{f.name} must not be negative")
+        return thresholds
+
+    def latency_limit(self, key: str) -> float:
+        return self.latency_overrides.get(key, self.max_latency_increase)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def load_report_statistics(report_path: Path) -> Dict[str, Any]:
+    """Statistics of a JSON report, filling in fields that older reports did not record"""
+    stats = read_report_statistics(report_path)
+
+    if 'latency_percentiles' not in stats or 'achieved_rate' not in stats:
+        results = read_report(report_path).get('detailed_results', [])
+        durations = np.array([r['duration'] for r in results if r.get('duration') is not None], dtype='float64')
+        stats.setdefault('latency_percentiles', latency_percentiles(durations))
+        if 'achieved_rate' not in stats:
+            span = _span_seconds(stats.get('test_start_time'), stats.get('test_end_time'))
+            stats['achieved_rate'] = stats.get('successful_emails', 0) / span if span > 0 else 0.0
+    return stats
+
+
+def find_scenario_reports(reports_dir: Path, scenario_name: str) -> List[Path]:
+    """JSON reports of one scenario (plain or compressed), oldest first"""
+    return [group.json_path for group in report_groups(reports_dir, scenario_name) if group.json_path]
+
+
+def compare_statistics(baseline: Dict[str, Any], candidate: Dict[str, Any],
+                       thresholds: RegressionThresholds) -> Dict[str, Any]:
+    """Compare one run against a baseline run and list what regressed"""
+    regressions: List[str] = []
+
+    # Throughput
+    base_rate = baseline.get('achieved_rate') or 0.0
+    cand_rate = candidate.get('achieved_rate') or 0.0
+    rate_change = _change_pct(base_rate, cand_rate)
+    rate_regressed = rate_change is not None and -rate_change > thresholds.max_throughput_drop
+    if rate_regressed:
+        regressions.append(
+            f"Throughput dropped {-rate_change:.1f}% ({base_rate:.2f} -> {cand_rate:.2f} emails/s), "
+            f"limit {thresholds.max_throughput_drop:g}%"
+        )
+    throughput = {
+        'baseline': base_rate,
+        'candidate': cand_rate,
+        'change_pct': rate_change,
+        'regression': rate_regressed
+    }
+
+    # Latency distribution, percentile by percentile
+    latency = {}
+    base_latency = baseline.get('latency_percentiles') or {}
+    cand_latency = candidate.get('latency_percentiles') or {}
+    for q in LATENCY_PERCENTILES:
+        key = percentile_key(q)
+        base_value, cand_value = base_latency.get(key), cand_latency.get(key)
+        delta = cand_value - base_value if base_value is not None and cand_value is not None else None
+        change = _change_pct(base_value, cand_value)
+        limit = thresholds.latency_limit(key)
+        regressed = (
+            change is not None and change > limit
+            and delta is not None and delta >= thresholds.min_latency_delta
+        )
+        if regressed:
+            regressions.append(
+                f"{key} latency rose {change:.1f}% ({base_value:.3f}s -> {cand_value:.3f}s), limit {limit:g}%"
+            )
+        latency[key] = {
+            'baseline': base_value,
+            'candidate': cand_value,
+            'delta': delta,
+            'change_pct': change,
+            'regression': regressed
+        }
+
+    # Error rate and mix, as percentage of all emails sent
+    base_error_rate = _error_rate(baseline)
+    cand_error_rate = _error_rate(candidate)
+    error_rate_delta = cand_error_rate - base_error_rate
+    error_rate_regressed = error_rate_delta > thresholds.max_error_rate_increase
+    if error_rate_regressed:
+        regressions.append(
+            f"Error rate rose {error_rate_delta:.2f} points ({base_error_rate:.2f}% -> {cand_error_rate:.2f}%), "
+            f"limit {thresholds.max_error_rate_increase:g}"
+        )
+    error_rate = {
+        'baseline': base_error_rate,
+        'candidate': cand_error_rate,
+        'delta': error_rate_delta,
+        'regression': error_rate_regressed
+    }
+
+    error_mix = {}
+    base_errors = _error_shares(baseline)
+    cand_errors = _error_shares(candidate)
+    for category in sorted(set(base_errors) | set(cand_errors)):
+        base_share, cand_share = base_errors.get(category, 0.0), cand_errors.get(category, 0.0)
+        delta = cand_share - base_share
+        regressed = delta > thresholds.max_error_category_increase
+        if regressed:
+            label = "New error" if category not in base_errors else "Error"
+            regressions.append(
+                f"{label} '{category}' rose {delta:.2f} points ({base_share:.2f}% -> {cand_share:.2f}%), "
+                f"limit {thresholds.max_error_category_increase:g}"
+            )
+        error_mix[category] = {
+            'baseline': base_share,
+            'candidate': cand_share,
+            'delta': delta,
+            'new': category not in base_errors,
+            'regression': regressed
+        }
+
+    return {
+        'throughput': throughput,
+        'latency': latency,
+        'error_rate': error_rate,
+        'error_mix': error_mix,
+        'regressions': regressions,
+        'verdict': Verdict.FAIL if regressions else Verdict.PASS
+    }
+
+
+def compare_reports(reports: List[Tuple[str, Dict[str, Any]]],
+                    thresholds: Optional[RegressionThresholds] = None) -> Dict[str, Any]:
+    """Compare every run against the first one; (name, statistics) pairs in baseline-first order"""
+    if len(reports) < 2:
+        raise ValueError("At least two reports are needed for a comparison")
+    thresholds = thresholds or RegressionThresholds()
+    baseline_name, baseline = reports[0]
+
+    comparisons = []
+    for name, stats in reports[1:]:
+        comparison = compare_statistics(baseline, stats, thresholds)
+        comparison['report'] = name
+        comparisons.append(comparison)
+
+    return {
+        'baseline': baseline_name,
+        'runs': [_run_summary(name, stats) for name, stats in reports],
+        'thresholds': thresholds.to_dict(),
+        'comparisons': comparisons,
+        'verdict': Verdict.FAIL if any(c['verdict'] == Verdict.FAIL for c in comparisons) else Verdict.PASS
+    }
+
+
+def _run_summary(name: str, stats: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'report': name,
+        'scenario_name': stats.get('scenario_name'),
+        'test_start_time': stats.get('test_start_time'),
+        'partial': stats.get('partial', False),
+        'generator_saturated': (stats.get('generator') or {}).get('saturated', False),
+        'total_emails': stats.get('total_emails', 0),
+        'success_rate': stats.get('success_rate'),
+        'achieved_rate': stats.get('achieved_rate'),
+        'latency_percentiles': stats.get('latency_percentiles', {}),
+        'corrected_latency_percentiles': stats.get('corrected_latency_percentiles', {}),
+        'error_categories': stats.get('error_categories', {})
+    }
+
+
+def _change_pct(baseline: Optional[float], candidate: Optional[float]) -> Optional[float]:
+    if baseline is None or candidate is None or baseline == 0:
+        return None
+    return (candidate - baseline) / baseline * 100
+
+
+def _error_rate(stats: Dict[str, Any]) -> float:
+    total = stats.get('total_emails') or 0
+    return stats.get('failed_emails', 0) / total * 100 if total else 0.0
+
+
+def _error_shares(stats: Dict[str, Any]) -> Dict[str, float]:
+    total = stats.get('total_emails') or 0
+    if not total:
+        return {}
+    return {category: count / total * 100 for category, count in (stats.get('error_categories') or {}).items()}
+
+
+def _span_seconds(start: Optional[str], end: Optional[str]) -> float:
+    if not start or not end or 'NaT' in (start, end):
+        return 0.0
+    return float((np.datetime64(end, 'us') - np.datetime64(start, 'us')).astype('float64') / 1e6)
+
+
+__all__ = ['Verdict', 'RegressionThresholds', 'load_report_statistics', 'find_scenario_reports',
+           'compare_statistics', 'compare_reports']
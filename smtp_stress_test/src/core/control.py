@@ -0,0 +1,160 @@
+import asyncio
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+
+class RunControl:
+    """Settings of one run that can be changed while it is running.
+
+    Workers ask the control when their next send is due, so a new rate, a pause or
+    a resume takes effect immediately; timeouts apply from the next connection or
+    send. Every change is kept as an annotation for the report timeline.
+    """
+
+    FIELDS = ('target_rate', 'concurrency', 'paused', 'connect_timeout', 'send_timeout')
+
+    def __init__(self, concurrency: int, target_rate: Optional[float] = None,
+                 timeout_settings: Optional[Dict[str, float]] = None):
+        self.concurrency = max(1, int(concurrency))
+        self.target_rate = target_rate
+        self.paused = False
+        # Alapértelmezett timeout beállítások, ha a hívó nem ad meg mást
+        self.timeout_settings = {
+            "connect_timeout": 1.0,
+            "send_timeout": 1.0
+        }
+        if timeout_settings:
+            self.timeout_settings.update(timeout_settings)
+        self.annotations: List[Dict[str, Any]] = []
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self._lock = asyncio.Lock()
+        self._resumed = asyncio.Event()
+        self._resumed.set()
+        # Set and replaced on every change, wakes a worker waiting for its slot
+        self._changed = asyncio.Event()
+        self._paused_at: Optional[float] = None
+        # Open-loop schedule: slot n is due at anchor + n / target_rate
+        self._anchor = time.perf_counter()
+        self._slots = 0
+
+    def start(self, run_start: float) -> None:
+        """Anchor the open-loop schedule at the start of the run"""
+        self._anchor = run_start
+        self._slots = 0
+
+    def add_listener(self, listener: Callable[[Dict[str, Any]], None]) -> None:
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[Dict[str, Any]], None]) -> None:
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    async def next_start(self) -> float:
+        """Wait until the next send is due and return when it was due (perf_counter time).
+
+        Without a target rate a send is due as soon as a worker asks for it. On the
+        open-loop schedule slots are handed out in order, and a late slot is returned
+        right away with its original due time.
+        """
+        async with self._lock:
+            while True:
+                await self._resumed.wait()
+                changed = self._changed
+                if not self.target_rate:
+                    return time.perf_counter()
+                due = self._anchor + self._slots / self.target_rate
+                wait = due - time.perf_counter()
+                if wait <= 0:
+                    self._slots += 1
+                    return due
+                try:
+                    await asyncio.wait_for(changed.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    def apply(self, changes: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Validate and apply changes; returns the recorded annotation, None if nothing changed"""
+        values = self._parse(changes)
+        applied = {key: value for key, value in values.items() if self._value(key) != value}
+        if not applied:
+            return None
+        previous = {key: self._value(key) for key in applied}
+        now = time.perf_counter()
+
+        if 'target_rate' in applied:
+            # A faster schedule starts now; a run that is behind keeps its backlog
+            reference = self._paused_at if self.paused else now
+            if self.target_rate:
+                reference = min(reference, self._anchor + self._slots / self.target_rate)
+            self._anchor, self._slots = reference, 0
+            self.target_rate = applied['target_rate']
+        if 'concurrency' in applied:
+            self.concurrency = applied['concurrency']
+        for key in ('connect_timeout', 'send_timeout'):
+            if key in applied:
+                self.timeout_settings[key] = applied[key]
+        if 'paused' in applied:
+            self.paused = applied['paused']
+            if self.paused:
+                self._paused_at = now
+                self._resumed.clear()
+            else:
+                # The schedule does not count the pause as lateness
+                self._anchor += now - self._paused_at
+                self._paused_at = None
+                self._resumed.set()
+
+        annotation = {
+            'time': datetime.now().isoformat(),
+            'changes': applied,
+            'previous': previous
+        }
+        self.annotations.append(annotation)
+        self._changed.set()
+        self._changed = asyncio.Event()
+        for listener in list(self._listeners):
+            listener(annotation)
+        return annotation
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'target_rate': self.target_rate,
+            'concurrency': self.concurrency,
+            'paused': self.paused,
+            **self.timeout_settings,
+            'annotations': self.annotations
+        }
+
+    def _value(self, key: str) -> Any:
+        if key in self.timeout_settings:
+            return self.timeout_settings[key]
+        return getattr(self, key)
+
+    def _parse(self, changes: Dict[str, Any]) -> Dict[str, Any]:
+        unknown = set(changes) - set(self.FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown run control settings: {', '.join(sorted(unknown))}")
+        values: Dict[str, Any] = {}
+        if 'target_rate' in changes:
+            rate = changes['target_rate']
+            values['target_rate'] = float(rate) if rate is not None else None
+            if values['target_rate'] is not None and values['target_rate'] <= 0:
+                raise ValueError("target_rate must be positive, or null for no schedule")
+        if 'concurrency' in changes:
+            values['concurrency'] = int(changes['concurrency'])
+            if values['concurrency'] < 1:
+                raise ValueError("concurrency must be at least 1, pause the run to stop sending")
+        if 'paused' in changes:
+            if not isinstance(changes['paused'], bool):
+                raise ValueError("paused must be true or false")
+            values['paused'] = changes['paused']
+        for key in ('connect_timeout', 'send_timeout'):
+            if key in changes:
+                values[key] = float(changes[key])
+                if values[key] <= 0:
+                    raise ValueError(f"{key} must be positive")
+        return values
+
+
+__all__ = ['RunControl']
@@ -0,0 +1,178 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# A generator sample counts as saturated above these limits
+LOOP_LAG_LIMIT = 0.05
+CPU_LIMIT = 90.0
+FD_USAGE_LIMIT = 0.9
+# Share of saturated samples that makes a run's results untrustworthy
+SATURATED_SHARE_LIMIT = 0.05
+
+
+class GeneratorMonitor:
+    """Samples the health of the load generator itself while a run is going.
+
+    Event loop lag is probed every probe_interval seconds; every interval a sample
+    records the worst and average lag since the previous one, process CPU (100% is
+    one core), RSS, open file descriptors, open sockets and sends in flight. A
+    saturated generator delays sends on its own, so such runs say little about the
+    SMTP server.
+    """
+
+    def __init__(self, in_flight: Optional[Callable[[], int]] = None,
+                 interval: float = 1.0, probe_interval: float = 0.05):
+        self.in_flight = in_flight
+        self.interval = interval
+        self.probe_interval = probe_interval
+        self.samples: List[Dict[str, Any]] = []
+        self.fd_limit = _fd_limit()
+
+    async def run(self) -> None:
+        """Sample until cancelled"""
+        loop = asyncio.get_running_loop()
+        last_time, last_cpu = time.perf_counter(), time.process_time()
+        lags: List[float] = []
+        while True:
+            expected = loop.time() + self.probe_interval
+            await asyncio.sleep(self.probe_interval)
+            lags.append(max(0.0, loop.time() - expected))
+
+            now = time.perf_counter()
+            if now - last_time < self.interval:
+                continue
+            cpu = time.process_time()
+            in_flight = self.in_flight() if self.in_flight else None
+            # Listing /proc/self/fd takes a while with thousands of sockets open
+            descriptors = await asyncio.to_thread(_descriptors)
+            self.samples.append(self._sample(lags, (cpu - last_cpu) / (now - last_time) * 100, descriptors, in_flight))
+            last_time, last_cpu = now, cpu
+            lags = []
+
+    def _sample(self, lags: List[float], cpu_percent: float, descriptors: tuple[Optional[int], Optional[int]],
+                in_flight: Optional[int]) -> Dict[str, Any]:
+        open_fds, sockets = descriptors
+        sample = {
+            'time': datetime.now().isoformat(),
+            'loop_lag_max': max(lags),
+            'loop_lag_avg': sum(lags) / len(lags),
+            'cpu_percent': cpu_percent,
+            'rss_bytes': _rss_bytes(),
+            'open_fds': open_fds,
+            'sockets': sockets,
+            'in_flight': in_flight
+        }
+        sample['saturated'] = bool(sample_warnings(sample, self.fd_limit))
+        return sample
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'interval': self.interval, 'fd_limit': self.fd_limit, 'samples': self.samples}
+
+
+def sample_warnings(sample: Dict[str, Any], fd_limit: Optional[int] = None) -> List[str]:
+    """Reasons a sample shows a saturated generator, empty if it looks healthy"""
+    reasons = []
+    if sample['loop_lag_max'] > LOOP_LAG_LIMIT:
+        reasons.append('loop_lag')
+    if sample['cpu_percent'] >= CPU_LIMIT:
+        reasons.append('cpu')
+    if fd_limit and sample.get('open_fds') is not None and sample['open_fds'] >= fd_limit * FD_USAGE_LIMIT:
+        reasons.append('file_descriptors')
+    return reasons
+
+
+def summarize_samples(samples: List[Dict[str, Any]], fd_limit: Optional[int] = None) -> Dict[str, Any]:
+    """Run-level view of the generator samples, with warnings when the generator was the bottleneck"""
+    if not samples:
+        return {'samples': 0, 'saturated': False, 'warnings': []}
+
+    def peak(key: str) -> Optional[float]:
+        values = [s[key] for s in samples if s.get(key) is not None]
+        return max(values) if values else None
+
+    lags = sorted(s['loop_lag_max'] for s in samples)
+    reasons: Dict[str, int] = {}
+    for sample in samples:
+        for reason in sample_warnings(sample, fd_limit):
+            reasons[reason] = reasons.get(reason, 0) + 1
+    saturated = sum(1 for s in samples if sample_warnings(s, fd_limit))
+    share = saturated / len(samples)
+
+    warnings = []
+    if reasons.get('loop_lag'):
+        warnings.append(f"Event loop lag exceeded {LOOP_LAG_LIMIT * 1000:.0f} ms in {reasons['loop_lag']} "
+                        f"of {len(samples)} samples (worst {lags[-1] * 1000:.0f} ms)")
+    if reasons.get('cpu'):
+        warnings.append(f"Generator CPU was at or above {CPU_LIMIT:.0f}% in {reasons['cpu']} of {len(samples)} samples")
+    if reasons.get('file_descriptors'):
+        warnings.append(f"Open file descriptors reached {FD_USAGE_LIMIT * 100:.0f}% of the limit ({fd_limit}) "
+                        f"in {reasons['file_descriptors']} samples")
+
+    return {
+        'samples': len(samples),
+        'max_loop_lag': lags[-1],
+        'p99_loop_lag': lags[min(len(lags) - 1, int(0.99 * len(lags)))],
+        'avg_cpu_percent': sum(s['cpu_percent'] for s in samples) / len(samples),
+        'max_cpu_percent': peak('cpu_percent'),
+        'max_rss_bytes': peak('rss_bytes'),
+        'max_open_fds': peak('open_fds'),
+        'fd_limit': fd_limit,
+        'max_sockets': peak('sockets'),
+        'max_in_flight': peak('in_flight'),
+        'saturated_samples': saturated,
+        # Occasional spikes are tolerated, a generator saturated this often invalidates the run
+        'saturated': share > SATURATED_SHARE_LIMIT,
+        'warnings': warnings
+    }
+
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        # Peak rather than current RSS where /proc is not available (KB on Linux, bytes on macOS)
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if os.uname().sysname == 'Darwin' else usage * 1024
+    return None
+
+
+def _descriptors() -> tuple[Optional[int], Optional[int]]:
+    """Open file descriptors and how many of them are sockets (Linux only)"""
+    for fd_dir in ('/proc/self/fd', '/dev/fd'):
+        try:
+            fds = os.listdir(fd_dir)
+        except OSError:
+            continue
+        if fd_dir != '/proc/self/fd':
+            return len(fds), None
+        sockets = 0
+        for fd in fds:
+            try:
+                if os.readlink(os.path.join(fd_dir, fd)).startswith('socket:'):
+                    sockets += 1
+            except OSError:
+                # Closed between listing and reading
+                pass
+        return len(fds), sockets
+    return None, None
+
+
+def _fd_limit() -> Optional[int]:
+    if resource is None:
+        return None
+    soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    return soft if soft != resource.RLIM_INFINITY else None
+
+
+__all__ = ['LOOP_LAG_LIMIT', 'CPU_LIMIT', 'SATURATED_SHARE_LIMIT', 'GeneratorMonitor', 'sample_warnings',
+           'summarize_samples']
@@ -0,0 +1,230 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple, Union
+import base64
+import math
+import random
+import re
+
+_SIZE_UNITS = {
+    '': 1,
+    'B': 1,
+    'KB': 1024,
+    'MB': 1024 ** 2,
+    'GB': 1024 ** 3
+}
+
+# Distinct start offset for every variant inside a shared buffer
+_VARIANT_STRIDE = 4093
+
+_WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua invoice order shipment account "
+    "report meeting update notification delivery status customer support team"
+).split()
+
+
+def parse_size(value: Union[int, float, str]) -> int:
+    """Parse a byte size given as a number or a string such as '5KB' or '25 MB'"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.fullmatch(r'\s*([\d.]+)\s*([KMG]?B?)\s*', str(value).upper())
+    if not match:
+        raise ValueError(f"Invalid size: {value!r}")
+    number, unit = match.groups()
+    if unit in ('K', 'M', 'G'):
+        unit += 'B'
+    return int(float(number) * _SIZE_UNITS[unit])
+
+
+@dataclass
+class SizeDistribution:
+    """Message part size: fixed, uniform or lognormal between min_size and max_size"""
+    distribution: str = 'fixed'
+    size: Optional[int] = None
+    min_size: Optional[int] = None
+    max_size: Optional[int] = None
+    median: Optional[int] = None
+    sigma: float = 1.0
+
+    @classmethod
+    def from_value(cls, value: Union[int, str, Dict[str, Any]]) -> 'SizeDistribution':
+        if not isinstance(value, dict):
+            return cls(size=parse_size(value))
+
+        dist = cls(
+            distribution=value.get('distribution', 'fixed'),
+            size=parse_size(value['size']) if value.get('size') is not None else None,
+            min_size=parse_size(value['min_size']) if value.get('min_size') is not None else None,
+            max_size=parse_size(value['max_size']) if value.get('max_size') is not None else None,
+            median=parse_size(value['median']) if value.get('median') is not None else None,
+            sigma=float(value.get('sigma', 1.0))
+        )
+        dist.validate()
+        return dist
+
+    def validate(self) -> None:
+        if self.distribution == 'fixed':
+            if self.size is None:
+                raise ValueError("Fixed size distribution requires 'size'")
+        elif self.distribution in ('uniform', 'lognormal'):
+            if self.min_size is None or self.max_size is None:
+                raise ValueError(f"{self.distribution} distribution requires 'min_size' and 'max_size'")
+            if self.min_size > self.max_size:
+                raise ValueError("'min_size' must not be greater than 'max_size'")
+        else:
+            raise ValueError(f"Unknown size distribution: {self.distribution}")
+
+    def sample(self, rng: random.Random) -> int:
+        if self.distribution == 'fixed':
+            return self.size
+        if self.distribution == 'uniform':
+            return rng.randint(self.min_size, self.max_size)
+
+        # Lognormal: default median is the geometric mean of the bounds
+        median = self.median or math.sqrt(max(self.min_size, 1) * self.max_size)
+        value = rng.lognormvariate(math.log(median), self.sigma)
+        return int(min(max(value, self.min_size), self.max_size))
+
+    def to_dict(self) -> Dict[str, Any]:
+        if self.distribution == 'fixed':
+            return {'distribution': 'fixed', 'size': self.size}
+        data = {
+            'distribution': self.distribution,
+            'min_size': self.min_size,
+            'max_size': self.max_size
+        }
+        if self.distribution == 'lognormal':
+            data['median'] = self.median
+            data['sigma'] = self.sigma
+        return data
+
+
+@dataclass
+class PayloadSpec:
+    """Synthetic body/attachment generation settings of an email template"""
+    body_size: Optional[SizeDistribution] = None
+    attachment_size: Optional[SizeDistribution] = None
+    attachment_count: int = 1
+    seed: int = 0
+    compressible: bool = False
+    variants: int = 32
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'PayloadSpec':
+        return cls(
+            body_size=SizeDistribution.from_value(data['body_size']) if data.get('body_size') is not None else None,
+            attachment_size=SizeDistribution.from_value(data['attachment_size']) if data.get('attachment_size') is not None else None,
+            attachment_count=int(data.get('attachment_count', 1)),
+            seed=int(data.get('seed', 0)),
+            compressible=bool(data.get('compressible', False)),
+            variants=max(1, int(data.get('variants', 32)))
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'body_size': self.body_size.to_dict() if self.body_size else None,
+            'attachment_size': self.attachment_size.to_dict() if self.attachment_size else None,
+            'attachment_count': self.attachment_count,
+            'seed': self.seed,
+            'compressible': self.compressible,
+            'variants': self.variants
+        }
+
+
+class PayloadPool:
+    """Pre-generated payload variants as read-only memoryviews over one shared buffer.
+
+    Every variant is a slice of the same deterministic byte stream, so the memory
+    cost is roughly the largest variant, independent of how many sends use them.
+    """
+
+    def __init__(self, sizes: List[int], seed: int, compressible: bool, text: bool):
+        self.sizes = sizes
+        rng = random.Random(seed)
+        buffer_size = max(sizes) + _VARIANT_STRIDE * len(sizes)
+        if compressible:
+            data = _compressible_bytes(rng, buffer_size)
+        elif text:
+            data = _incompressible_text(rng, buffer_size)
+        else:
+            data = rng.randbytes(buffer_size)
+
+        self._buffer = memoryview(data).toreadonly()
+        self.views = [
+            self._buffer[i * _VARIANT_STRIDE:i * _VARIANT_STRIDE + size]
+            for i, size in enumerate(sizes)
+        ]
+
+    def __len__(self) -> int:
+        return len(self.views)
+
+    def __getitem__(self, index: int) -> memoryview:
+        return self.views[index]
+
+    @property
+    def nbytes(self) -> int:
+        return self._buffer.nbytes
+
+
+class SyntheticPayload:
+    """Body and attachment pools for one PayloadSpec"""
+
+    def __init__(self, spec: PayloadSpec):
+        self.spec = spec
+        rng = random.Random(spec.seed)
+        self.body: Optional[PayloadPool] = None
+        self.attachments: Optional[PayloadPool] = None
+
+        if spec.body_size:
+            sizes = [spec.body_size.sample(rng) for _ in range(spec.variants)]
+            self.body = PayloadPool(sizes, spec.seed, spec.compressible, text=True)
+        if spec.attachment_size and spec.attachment_count > 0:
+            sizes = [spec.attachment_size.sample(rng) for _ in range(spec.variants)]
+            self.attachments = PayloadPool(sizes, spec.seed + 1, spec.compressible, text=False)
+
+    def body_text(self, variant: int) -> Optional[str]:
+        if self.body is None:
+            return None
+        return str(self.body[variant % len(self.body)], 'ascii')
+
+    def attachment_views(self, variant: int) -> List[Tuple[str, memoryview]]:
+        """Attachment (filename, bytes) pairs for a variant; consecutive pool entries per attachment"""
+        if self.attachments is None:
+            return []
+        views = []
+        for i in range(self.spec.attachment_count):
+            index = (variant + i) % len(self.attachments)
+            view = self.attachments[index]
+            views.append((f"synthetic_{index}_{len(view)}.bin", view))
+        return views
+
+
+# Payloads are shared by every sender in the process that uses an identical spec
+_payload_cache: Dict[str, SyntheticPayload] = {}
+
+
+def get_synthetic_payload(spec: PayloadSpec) -> SyntheticPayload:
+    key = repr(spec)
+    payload = _payload_cache.get(key)
+    if payload is None:
+        payload = SyntheticPayload(spec)
+        _payload_cache[key] = payload
+    return payload
+
+
+def _compressible_bytes(rng: random.Random, size: int) -> bytes:
+    # Seeded text block repeated to the requested size
+    block = ' '.join(rng.choice(_WORDS) for _ in range(700)).encode('ascii')
+    lines = b'\n'.join(block[i:i + 76] for i in range(0, len(block), 76)) + b'\n'
+    return (lines * (size // len(lines) + 1))[:size]
+
+
+def _incompressible_text(rng: random.Random, size: int) -> bytes:
+    # Random bytes in base64 alphabet, wrapped into 76 character lines
+    raw = base64.b64encode(rng.randbytes(size * 3 // 4 + 3))
+    lines = b'\n'.join(raw[i:i + 76] for i in range(0, len(raw), 76))
+    return lines[:size]
+
+
+__all__ = ['SizeDistribution', 'PayloadSpec', 'PayloadPool', 'SyntheticPayload',
+           'get_synthetic_payload', 'parse_size']
@@ -0,0 +1,275 @@
+import gzip
+import io
+import json
+import re
+import time
+from dataclasses import dataclass, asdict, field, fields
+from pathlib import Path
+from typing import Any, Dict, IO, Iterator, List, Optional
+
+try:
+    import zstandard
+except ImportError:  # zstd compression is optional
+    zstandard = None
+
+# File suffix and HTTP Content-Encoding of each supported compression
+COMPRESSIONS = {
+    'gzip': ('.gz', 'gzip'),
+    'zstd': ('.zst', 'zstd'),
+}
+JSON_REPORT_SUFFIXES = ('.json', '.json.gz', '.json.zst')
+# Results written per write() call by the streaming writer
+WRITE_BATCH = 1000
+
+# report_<scenario>_<timestamp>, with the run ID at the end for runs started through the API
+_REPORT_NAME = re.compile(r"^report_(?P<scenario>.+)_(?P<timestamp>\d{8}_\d{6})(?:_(?P<run_id>[0-9a-f]{12}))?$")
+_STATISTICS_PREFIX = '{"statistics": '
+
+
+def check_compression(compression: Optional[str]) -> None:
+    if compression is None:
+        return
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"Unknown report compression '{compression}', expected one of: {', '.join(COMPRESSIONS)}")
+    if compression == 'zstd' and zstandard is None:
+        raise ValueError("zstd report compression requires the 'zstandard' package")
+
+
+def json_report_name(base_name: str, compression: Optional[str] = None) -> str:
+    return base_name + '.json' + (COMPRESSIONS[compression][0] if compression else '')
+
+
+def content_encoding(path: Path) -> Optional[str]:
+    """HTTP Content-Encoding a report file can be served with as-is"""
+    for suffix, encoding in COMPRESSIONS.values():
+        if path.name.endswith(suffix):
+            return encoding
+    return None
+
+
+def report_base_name(name: str) -> str:
+    """report_x_20250101_120000_<run_id>.json.gz -> report_x_20250101_120000_<run_id>"""
+    name = Path(name).name
+    for suffix in JSON_REPORT_SUFFIXES + ('.html',):
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return name
+
+
+def find_json_report(reports_dir: Path, base_name: str) -> Optional[Path]:
+    """Existing JSON report of a report, whichever compression it was written with"""
+    for suffix in JSON_REPORT_SUFFIXES:
+        path = Path(reports_dir) / (base_name + suffix)
+        if path.exists():
+            return path
+    return None
+
+
+def open_report(path: Path, mode: str = 'r') -> IO[str]:
+    """Open a JSON report as text, compressing or decompressing by its suffix"""
+    path = Path(path)
+    if path.name.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8', compresslevel=6)
+    if path.name.endswith('.zst'):
+        if zstandard is None:
+            raise ValueError("Reading zstd reports requires the 'zstandard' package")
+        raw = open(path, mode + 'b')
+        if mode == 'w':
+            stream = zstandard.ZstdCompressor().stream_writer(raw)
+        else:
+            stream = zstandard.ZstdDecompressor().stream_reader(raw)
+        return io.TextIOWrapper(stream, encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def iter_report_bytes(path: Path, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+    """Decompressed content of a report, for clients that cannot decode it themselves"""
+    with open_report(path) as f:
+        stream = f.buffer if hasattr(f, 'buffer') else f
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk if isinstance(chunk, bytes) else chunk.encode('utf-8')
+
+
+def write_json_report(path: Path, statistics: Dict[str, Any], results: List[Dict[str, Any]]) -> Path:
+    """Stream a report to disk: statistics on the first line, then one result per line.
+
+    The document is valid JSON, but never built in memory as a whole. It goes to a
+    temporary file first so readers never see a half written report.
+    """
+    path = Path(path)
+    # Same suffix (and so the same compression) as the final file, hidden from report_* globs
+    tmp_path = path.with_name('.tmp-' + path.name)
+    encode = json.JSONEncoder(separators=(',', ':')).encode
+    with open_report(tmp_path, 'w') as f:
+        f.write(_STATISTICS_PREFIX + json.dumps(statistics) + ',\n"detailed_results": [')
+        for start in range(0, len(results), WRITE_BATCH):
+            batch = ',\n'.join(encode(result) for result in results[start:start + WRITE_BATCH])
+            f.write(('\n' if start == 0 else ',\n') + batch)
+        f.write('\n]}\n')
+    tmp_path.replace(path)
+    return path
+
+
+def read_report(path: Path) -> Dict[str, Any]:
+    with open_report(path) as f:
+        return json.load(f)
+
+
+def read_report_statistics(path: Path) -> Dict[str, Any]:
+    """Statistics of a report without loading its detailed results where possible"""
+    with open_report(path) as f:
+        first_line = f.readline()
+        if first_line.startswith(_STATISTICS_PREFIX) and first_line.rstrip().endswith(','):
+            return json.loads(first_line[len(_STATISTICS_PREFIX):].rstrip()[:-1])
+    # Pretty-printed reports written by older versions
+    return read_report(path).get('statistics', {})
+
+
+@dataclass
+class ReportGroup:
+    """The HTML and JSON files of one report"""
+    name: str
+    scenario_name: str
+    timestamp: str
+    files: List[Path] = field(default_factory=list)
+    run_id: Optional[str] = None
+
+    @property
+    def size(self) -> int:
+        return sum(path.stat().st_size for path in self.files if path.exists())
+
+    @property
+    def mtime(self) -> float:
+        return max((path.stat().st_mtime for path in self.files if path.exists()), default=0.0)
+
+    @property
+    def json_path(self) -> Optional[Path]:
+        for path in self.files:
+            if path.name.endswith(JSON_REPORT_SUFFIXES):
+                return path
+        return None
+
+    def remove(self) -> None:
+        for path in self.files:
+            path.unlink(missing_ok=True)
+
+
+def report_groups(reports_dir: Path, scenario_name: Optional[str] = None) -> List[ReportGroup]:
+    """Reports in a directory, oldest first"""
+    groups: Dict[str, ReportGroup] = {}
+    for path in Path(reports_dir).glob("report_*"):
+        if not path.name.endswith(JSON_REPORT_SUFFIXES + ('.html',)):
+            continue
+        base_name = report_base_name(path.name)
+        match = _REPORT_NAME.match(base_name)
+        if not match or (scenario_name is not None and match.group('scenario') != scenario_name):
+            continue
+        group = groups.setdefault(base_name, ReportGroup(base_name, match.group('scenario'), match.group('timestamp'),
+                                                             run_id=match.group('run_id')))
+        group.files.append(path)
+    # Reports of runs ending in the same second are ordered by when they were written
+    return sorted(groups.values(), key=lambda group: (group.timestamp, group.mtime, group.name))
+
+
+@dataclass
+class ReportSettings:
+    """Report output format and retention; None disables a retention rule"""
+    compression: Optional[str] = None
+    keep_last: Optional[int] = None
+    max_age_days: Optional[float] = None
+    max_total_mb: Optional[float] = None
+    cleanup_interval_minutes: float = 60.0
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ReportSettings':
+        known = {f.name for f in fields(cls)}
+        unknown = set(data) - known
+        if unknown:
+            raise ValueError(f"Unknown report settings: {', '.join(sorted(unknown))}")
+        data = dict(data)
+        if data.get('keep_last') is not None:
+            data['keep_last'] = int(data['keep_last'])
+        for name in ('max_age_days', 'max_total_mb', 'cleanup_interval_minutes'):
+            if data.get(name) is not None:
+                data[name] = float(data[name])
+        settings = cls(**data)
+        settings.validate()
+        return settings
+
+    @classmethod
+    def load(cls, path: Path) -> 'ReportSettings':
+        if not Path(path).exists():
+            return cls()
+        with open(path, 'r') as f:
+            return cls.from_dict(json.load(f))
+
+    def validate(self) -> None:
+        check_compression(self.compression)
+        if self.keep_last is not None and self.keep_last < 1:
+            raise ValueError("keep_last must be at least 1")
+        for name in ('max_age_days', 'max_total_mb'):
+            value = getattr(self, name)
+            if value is not None and value <= 0:
+                raise ValueError(f"{name} must be positive")
+        if not self.cleanup_interval_minutes or self.cleanup_interval_minutes <= 0:
+            raise ValueError("cleanup_interval_minutes must be positive")
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=4)
+        tmp_path.replace(path)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def apply_retention(reports_dir: Path, settings: ReportSettings, now: Optional[float] = None) -> List[ReportGroup]:
+    """Delete reports beyond keep_last per scenario, older than max_age_days, then the
+    oldest ones until the directory fits into max_total_mb. The newest report is never removed."""
+    now = time.time() if now is None else now
+    groups = report_groups(reports_dir)
+    if not groups:
+        return []
+    newest = groups[-1]
+    doomed: Dict[str, ReportGroup] = {}
+
+    if settings.keep_last:
+        by_scenario: Dict[str, List[ReportGroup]] = {}
+        for group in groups:
+            by_scenario.setdefault(group.scenario_name, []).append(group)
+        for scenario_groups in by_scenario.values():
+            for group in scenario_groups[:-settings.keep_last]:
+                doomed[group.name] = group
+
+    if settings.max_age_days:
+        cutoff = now - settings.max_age_days * 86400
+        for group in groups:
+            if group.mtime < cutoff:
+                doomed[group.name] = group
+
+    if settings.max_total_mb:
+        limit = settings.max_total_mb * 1024 * 1024
+        remaining = [group for group in groups if group.name not in doomed]
+        total = sum(group.size for group in remaining)
+        for group in remaining:
+            if total <= limit:
+                break
+            doomed[group.name] = group
+            total -= group.size
+
+    doomed.pop(newest.name, None)
+    for group in doomed.values():
+        group.remove()
+    return list(doomed.values())
+
+
+__all__ = ['COMPRESSIONS', 'JSON_REPORT_SUFFIXES', 'check_compression', 'json_report_name', 'content_encoding',
+           'report_base_name', 'find_json_report', 'open_report', 'iter_report_bytes', 'write_json_report',
+           'read_report', 'read_report_statistics', 'ReportGroup', 'report_groups', 'ReportSettings',
+           'apply_retention']
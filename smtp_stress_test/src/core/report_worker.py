@@ -0,0 +1,128 @@
+import asyncio
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .checkpoint import RunCheckpoint
+
+# Steps of a report build, in order
+REPORT_STAGES = ('loading', 'statistics', 'json', 'html', 'done')
+PROGRESS_FILE = "report_progress.json"
+
+
+@dataclass
+class ReportJob:
+    """Everything a report worker needs; results and annotations are read from the run checkpoint"""
+    scenario_name: str
+    run_id: str
+    checkpoint_dir: Path
+    output_dir: Path
+    template_dir: Path
+    partial: bool = False
+    window_seconds: float = 1.0
+    compression: Optional[str] = None
+    generator: Optional[Dict[str, Any]] = None
+
+
+def build_reports(job: ReportJob) -> Optional[Dict[str, str]]:
+    """Write the JSON and HTML reports of a checkpointed run and return their file names.
+
+    Runs in a worker process: statistics are computed once for both reports, and
+    every stage is written to the progress file of the checkpoint.
+    """
+    # pandas and jinja2 are only imported in the worker
+    from .reporter import TestReporter
+
+    progress_path = Path(job.checkpoint_dir) / PROGRESS_FILE
+    started_at = datetime.now().isoformat()
+
+    def stage(name: str, **extra: Any) -> None:
+        _write_progress(progress_path, {
+            'stage': name,
+            'step': REPORT_STAGES.index(name),
+            'steps': len(REPORT_STAGES) - 1,
+            'started_at': started_at,
+            'updated_at': datetime.now().isoformat(),
+            **extra
+        })
+
+    stage('loading')
+    checkpoint = RunCheckpoint(job.checkpoint_dir)
+    results = checkpoint.load_results()
+    if not results:
+        stage('done', results=0)
+        return None
+
+    reporter = TestReporter(job.scenario_name, results, partial=job.partial, window_seconds=job.window_seconds,
+                            annotations=checkpoint.annotations, generator=job.generator, run_id=job.run_id,
+                            resumes=checkpoint.resumes)
+    stage('statistics', results=len(results))
+    stats = reporter.generate_statistics()
+    stage('json', results=len(results))
+    json_report = reporter.save_json_report(job.output_dir, compression=job.compression, stats=stats)
+    stage('html', results=len(results))
+    html_report = reporter.generate_html_report(job.template_dir, job.output_dir, stats=stats)
+    stage('done', results=len(results))
+    return {'json': json_report.name, 'html': html_report.name}
+
+
+def read_progress(checkpoint_dir: Path) -> Optional[Dict[str, Any]]:
+    """Last stage a report build of this run reached, None if none was started"""
+    path = Path(checkpoint_dir) / PROGRESS_FILE
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+class ReportWorker:
+    """Builds reports in separate processes, so DataFrame work, Jinja rendering and report
+    writes never block the event loop or the runs still sending.
+
+    The pool is started on first use and uses spawned processes, which do not
+    inherit the event loop and threads of the server.
+    """
+
+    def __init__(self, max_workers: int = 1):
+        self.max_workers = max_workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    async def build(self, job: ReportJob) -> Optional[Dict[str, str]]:
+        loop = asyncio.get_running_loop()
+        pool = self._executor()
+        try:
+            return await loop.run_in_executor(pool, build_reports, job)
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); the next build starts a new pool
+            if self._pool is pool:
+                self._pool = None
+            raise
+
+    def shutdown(self) -> None:
+        """Drop queued builds and wait for the one in progress, so its report is complete"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                             mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+
+def _write_progress(path: Path, progress: Dict[str, Any]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix('.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump(progress, f)
+    tmp_path.replace(path)
+
+
+__all__ = ['REPORT_STAGES', 'ReportJob', 'build_reports', 'read_progress', 'ReportWorker']
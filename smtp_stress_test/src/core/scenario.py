@@ -1,8 +1,14 @@
 from dataclasses import dataclass
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional, Union
 from pathlib import Path
 import json
 
+from .attachments import is_attachment_ref
+from .payload import PayloadSpec, SizeDistribution, parse_size
+from .targets import SMTPTarget
+from .source_address import SourceAddress
+from .transfer import DEFAULT_CHUNK_SIZE, TRANSFER_MODES
+
 @dataclass
 class EmailTemplate:
     subject: str
@@ -11,7 +17,71 @@ class EmailTemplate:
     to_email: List[str]
     cc_email: Optional[List[str]] = None
     bcc_email: Optional[List[str]] = None
-    attachments: Optional[List[Path]] = None
+    # File paths, or "sha256:<hex>" references into the attachment store
+    attachments: Optional[List[Union[Path, str]]] = None
+    synthetic_payload: Optional[PayloadSpec] = None
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'EmailTemplate':
+        data = dict(data)
+        if data.get('attachments'):
+            data['attachments'] = [
+                value if is_attachment_ref(value) else Path(value) for value in data['attachments']
+            ]
+        if data.get('synthetic_payload'):
+            data['synthetic_payload'] = PayloadSpec.from_dict(data['synthetic_payload'])
+        return cls(**data)
+
+@dataclass
+class MixTemplate:
+    """One message type of a traffic mix; email fields it does not set come from the scenario's email_template"""
+    name: str
+    weight: float
+    template: EmailTemplate
+    # Sender addresses picked at random; the template's from_email when not set
+    from_emails: Optional[List[str]] = None
+    # Recipients per message, drawn from the template's to_email (1 when not set)
+    recipient_count: Optional[SizeDistribution] = None
+    # The entry as written in the scenario file, so to_json keeps inherited fields inherited
+    source: Optional[Dict[str, Any]] = None
+
+    MIX_FIELDS = ('name', 'weight', 'from_emails', 'recipient_count')
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], base: Dict[str, Any]) -> 'MixTemplate':
+        if not data.get('name'):
+            raise ValueError("Every traffic_mix entry needs a name")
+        weight = float(data.get('weight', 1.0))
+        if weight <= 0:
+            raise ValueError(f"traffic_mix entry '{data['name']}': weight must be positive")
+        fields = {**base, **{key: value for key, value in data.items() if key not in cls.MIX_FIELDS}}
+        template = EmailTemplate.from_dict(fields)
+        if not template.to_email:
+            raise ValueError(f"traffic_mix entry '{data['name']}' has no recipients")
+        recipient_count = None
+        if data.get('recipient_count') is not None:
+            recipient_count = SizeDistribution.from_value(data['recipient_count'])
+            lowest = recipient_count.size if recipient_count.distribution == 'fixed' else recipient_count.min_size
+            if lowest < 1:
+                raise ValueError(f"traffic_mix entry '{data['name']}': recipient_count must be at least 1")
+        return cls(
+            name=data['name'],
+            weight=weight,
+            template=template,
+            from_emails=data.get('from_emails') or None,
+            recipient_count=recipient_count,
+            source=dict(data)
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = dict(self.source or {})
+        data.update({
+            'name': self.name,
+            'weight': self.weight,
+            'from_emails': self.from_emails,
+            'recipient_count': self.recipient_count.to_dict() if self.recipient_count else None
+        })
+        return data
 
 @dataclass
 class SMTPConfig:
@@ -21,6 +91,42 @@ class SMTPConfig:
     verify_cert: bool = True
     username: Optional[str] = None
     password: Optional[str] = None
+    targets: Optional[List[SMTPTarget]] = None
+    selection_strategy: str = 'round_robin'
+    max_connections_per_target: Optional[int] = None
+    reuse_connections: bool = False
+    source_addresses: Optional[List[SourceAddress]] = None
+    # data, 8bitmime, bdat or binarymime (see core.transfer); servers lacking the
+    # extension get the closest mode they support
+    transfer_mode: str = 'data'
+    # Bytes per BDAT command in the bdat and binarymime modes
+    bdat_chunk_size: int = DEFAULT_CHUNK_SIZE
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'SMTPConfig':
+        data = dict(data)
+        if data.get('transfer_mode') is None:
+            data.pop('transfer_mode', None)
+        elif data['transfer_mode'] not in TRANSFER_MODES:
+            raise ValueError(f"Unknown transfer_mode: {data['transfer_mode']}")
+        if data.get('bdat_chunk_size') is None:
+            data.pop('bdat_chunk_size', None)
+        else:
+            data['bdat_chunk_size'] = parse_size(data['bdat_chunk_size'])
+            if data['bdat_chunk_size'] <= 0:
+                raise ValueError("bdat_chunk_size must be positive")
+        if data.get('targets'):
+            data['targets'] = [SMTPTarget(**target) for target in data['targets']]
+            # host/port default to the first target so existing code paths keep working
+            data.setdefault('host', data['targets'][0].host)
+            data.setdefault('port', data['targets'][0].port)
+        if data.get('source_addresses'):
+            data['source_addresses'] = [SourceAddress.from_value(value) for value in data['source_addresses']]
+        return cls(**data)
+
+    def get_targets(self) -> List[SMTPTarget]:
+        """All targets of the scenario; a single host/port is a pool of one"""
+        return self.targets or [SMTPTarget(host=self.host, port=self.port)]
 
 @dataclass
 class TestScenario:
@@ -31,14 +137,35 @@ class TestScenario:
     num_threads: int
     emails_per_thread: int
     delay_between_emails: float = 0.0
+    # Interim results are flushed to disk this often during scheduled runs (0 disables)
+    checkpoint_interval_minutes: float = 5.0
+    # Width of the report timeline windows
+    report_window_seconds: float = 1.0
+    # When set, every finished run is compared with the previous one (see core.comparison)
+    regression_thresholds: Optional[Dict] = None
+    # Open-loop schedule in emails/second across all threads; replaces delay_between_emails
+    # and makes the coordinated-omission-corrected latency exact
+    target_rate: Optional[float] = None
+    # Weighted message types sent instead of email_template alone (see core.traffic_mix)
+    traffic_mix: Optional[List[MixTemplate]] = None
+    traffic_mix_seed: int = 0
 
     @classmethod
     def from_json(cls, json_path: Path) -> 'TestScenario':
         with open(json_path, 'r') as f:
             data = json.load(f)
         
-        smtp_config = SMTPConfig(**data['smtp_config'])
-        email_template = EmailTemplate(**data['email_template'])
+        smtp_config = SMTPConfig.from_dict(data['smtp_config'])
+        email_template = EmailTemplate.from_dict(data['email_template'])
+        target_rate = data.get('target_rate')
+        if target_rate is not None and target_rate <= 0:
+            raise ValueError("target_rate must be positive")
+        traffic_mix = None
+        if data.get('traffic_mix'):
+            traffic_mix = [MixTemplate.from_dict(entry, data['email_template']) for entry in data['traffic_mix']]
+            names = [entry.name for entry in traffic_mix]
+            if len(set(names)) != len(names):
+                raise ValueError("traffic_mix entry names must be unique")
         
         return cls(
             name=data['name'],
@@ -47,7 +174,13 @@ class TestScenario:
             email_template=email_template,
             num_threads=data['num_threads'],
             emails_per_thread=data['emails_per_thread'],
-            delay_between_emails=data.get('delay_between_emails', 0.0)
+            delay_between_emails=data.get('delay_between_emails', 0.0),
+            checkpoint_interval_minutes=data.get('checkpoint_interval_minutes', 5.0),
+            report_window_seconds=data.get('report_window_seconds', 1.0),
+            regression_thresholds=data.get('regression_thresholds'),
+            target_rate=target_rate,
+            traffic_mix=traffic_mix,
+            traffic_mix_seed=int(data.get('traffic_mix_seed', 0))
         )
 
     def to_json(self, json_path: Path) -> None:
@@ -58,8 +191,16 @@ class TestScenario:
                 'host': self.smtp_config.host,
                 'port': self.smtp_config.port,
                 'use_tls': self.smtp_config.use_tls,
+                'verify_cert': self.smtp_config.verify_cert,
                 'username': self.smtp_config.username,
-                'password': self.smtp_config.password
+                'password': self.smtp_config.password,
+                'targets': [target.to_dict() for target in self.smtp_config.targets] if self.smtp_config.targets else None,
+                'selection_strategy': self.smtp_config.selection_strategy,
+                'max_connections_per_target': self.smtp_config.max_connections_per_target,
+                'reuse_connections': self.smtp_config.reuse_connections,
+                'source_addresses': [address.to_dict() for address in self.smtp_config.source_addresses] if self.smtp_config.source_addresses else None,
+                'transfer_mode': self.smtp_config.transfer_mode,
+                'bdat_chunk_size': self.smtp_config.bdat_chunk_size
             },
             'email_template': {
                 'subject': self.email_template.subject,
@@ -68,11 +209,18 @@ class TestScenario:
                 'to_email': self.email_template.to_email,
                 'cc_email': self.email_template.cc_email,
                 'bcc_email': self.email_template.bcc_email,
-                'attachments': [str(path) for path in (self.email_template.attachments or [])]
+                'attachments': [str(path) for path in (self.email_template.attachments or [])],
+                'synthetic_payload': self.email_template.synthetic_payload.to_dict() if self.email_template.synthetic_payload else None
             },
             'num_threads': self.num_threads,
             'emails_per_thread': self.emails_per_thread,
-            'delay_between_emails': self.delay_between_emails
+            'delay_between_emails': self.delay_between_emails,
+            'checkpoint_interval_minutes': self.checkpoint_interval_minutes,
+            'report_window_seconds': self.report_window_seconds,
+            'regression_thresholds': self.regression_thresholds,
+            'target_rate': self.target_rate,
+            'traffic_mix': [entry.to_dict() for entry in self.traffic_mix] if self.traffic_mix else None,
+            'traffic_mix_seed': self.traffic_mix_seed
         }
         
         with open(json_path, 'w') as f:
@@ -0,0 +1,292 @@
+import asyncio
+import json
+import shutil
+import time
+import uuid
+from dataclasses import dataclass, asdict, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+class RunStatus:
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+    INTERRUPTED = "interrupted"
+
+    FINISHED = (COMPLETED, FAILED, CANCELLED, INTERRUPTED)
+
+
+@dataclass
+class TestRun:
+    run_id: str
+    scenario_name: str
+    priority: int = 0
+    concurrency: int = 1
+    status: str = RunStatus.QUEUED
+    queued_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    error: Optional[str] = None
+    report: Optional[Dict[str, Any]] = None
+    resume_from: Optional[str] = None
+    # What a running run is doing: "sending", then "reporting" while its reports are built
+    phase: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class RateLimiter:
+    """Token bucket shared by every running test; rate is emails per second, None means unlimited"""
+
+    def __init__(self, rate: Optional[float] = None):
+        self.rate = rate
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def set_rate(self, rate: Optional[float]) -> None:
+        self.rate = rate
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        if not self.rate:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                # Burst of at most one second worth of sends, but at least one send, so rates
+                # below one email per second still reach a whole token
+                self._tokens = min(max(self.rate, 1.0), self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                await asyncio.sleep(min((1.0 - self._tokens) / self.rate, 1.0))
+                if not self.rate:
+                    return
+
+
+class RunScheduler:
+    """Persistent priority queue of test runs sharing a global connection and rate budget.
+
+    Runs are admitted in priority order (higher first, then FIFO) while the sum of
+    the concurrency of the runs still sending fits into max_connections. A run larger than
+    the whole budget is started alone so it cannot starve.
+    """
+
+    MAX_HISTORY = 200
+
+    def __init__(self, state_path: Path, executor: Callable[[TestRun, RateLimiter], Awaitable[Optional[Dict[str, Any]]]],
+                 max_connections: Optional[int] = None, max_rate: Optional[float] = None):
+        self.state_path = Path(state_path)
+        self.executor = executor
+        self.max_connections = max_connections
+        self.rate_limiter = RateLimiter(max_rate)
+        self.runs: Dict[str, TestRun] = {}
+        self.tasks: Dict[str, asyncio.Task] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._shutting_down = False
+        self._load()
+
+    @property
+    def max_rate(self) -> Optional[float]:
+        return self.rate_limiter.rate
+
+    def start(self) -> None:
+        if self._dispatcher is None or self._dispatcher.done():
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch_loop())
+            self._wakeup.set()
+
+    async def shutdown(self) -> None:
+        self._shutting_down = True
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            await asyncio.gather(self._dispatcher, return_exceptions=True)
+        for task in list(self.tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+
+    def submit(self, scenario_name: str, priority: int = 0, concurrency: int = 1,
+               resume_from: Optional[str] = None) -> TestRun:
+        run = TestRun(
+            run_id=uuid.uuid4().hex[:12],
+            scenario_name=scenario_name,
+            priority=priority,
+            concurrency=max(1, concurrency),
+            resume_from=resume_from
+        )
+        self.runs[run.run_id] = run
+        self._save()
+        self._notify()
+        return run
+
+    async def cancel(self, run_id: str) -> TestRun:
+        return (await self.cancel_runs([run_id]))[0]
+
+    async def cancel_runs(self, run_ids: List[str]) -> List[TestRun]:
+        """Cancel queued runs and runs still sending; a run building its reports is left to finish.
+
+        Queued runs are dropped before any running one is cancelled, so the connections
+        a cancelled run frees cannot start a run that is being stopped with it.
+        """
+        runs = [self.runs[run_id] for run_id in run_ids]
+        for run in runs:
+            if run.status == RunStatus.QUEUED:
+                self._finish(run, RunStatus.CANCELLED)
+        tasks = [
+            self.tasks[run.run_id] for run in runs
+            if run.status == RunStatus.RUNNING and run.phase != 'reporting' and run.run_id in self.tasks
+        ]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return runs
+
+    def update_budget(self, max_connections: Optional[int], max_rate: Optional[float]) -> None:
+        self.max_connections = max_connections
+        self.rate_limiter.set_rate(max_rate)
+        self._save()
+        self._notify()
+
+    def set_concurrency(self, run: TestRun, concurrency: int) -> None:
+        """Concurrency of a running run changed; a lower one may let queued runs start"""
+        run.concurrency = concurrency
+        self._save()
+        self._notify()
+
+    def set_phase(self, run: TestRun, phase: str) -> None:
+        """A run building its reports sends nothing, so its connections go back to the queue"""
+        run.phase = phase
+        self._save()
+        self._notify()
+
+    def checkpoint_dir(self, run_id: str) -> Path:
+        return self.state_path.parent / run_id
+
+    def set_report(self, run: TestRun, report: Optional[Dict[str, Any]]) -> None:
+        run.report = report
+        self._save()
+
+    def get(self, run_id: str) -> Optional[TestRun]:
+        return self.runs.get(run_id)
+
+    def queued(self) -> List[TestRun]:
+        pending = [run for run in self.runs.values() if run.status == RunStatus.QUEUED]
+        return sorted(pending, key=lambda run: (-run.priority, run.queued_at))
+
+    def running(self) -> List[TestRun]:
+        return [run for run in self.runs.values() if run.status == RunStatus.RUNNING]
+
+    def queue_position(self, run_id: str) -> Optional[int]:
+        """1-based position among queued runs, None if the run is not waiting"""
+        for position, run in enumerate(self.queued(), start=1):
+            if run.run_id == run_id:
+                return position
+        return None
+
+    def latest_run(self, scenario_name: str) -> Optional[TestRun]:
+        runs = [run for run in self.runs.values() if run.scenario_name == scenario_name]
+        return max(runs, key=lambda run: run.queued_at) if runs else None
+
+    def describe(self, run: TestRun) -> Dict[str, Any]:
+        data = run.to_dict()
+        data['queue_position'] = self.queue_position(run.run_id)
+        return data
+
+    def _connections_in_use(self) -> int:
+        return sum(run.concurrency for run in self.running() if run.phase != 'reporting')
+
+    def _fits(self, run: TestRun) -> bool:
+        if not self.max_connections:
+            return True
+        in_use = self._connections_in_use()
+        return in_use == 0 or in_use + run.concurrency <= self.max_connections
+
+    async def _dispatch_loop(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            for run in self.queued():
+                if not self._fits(run):
+                    # Strict priority order: lower priority runs wait behind the head of the queue
+                    break
+                self._start_run(run)
+
+    def _start_run(self, run: TestRun) -> None:
+        run.status = RunStatus.RUNNING
+        run.phase = 'sending'
+        run.started_at = datetime.now().isoformat()
+        self._save()
+        task = asyncio.create_task(self._execute(run))
+        self.tasks[run.run_id] = task
+
+    async def _execute(self, run: TestRun) -> None:
+        try:
+            run.report = await self.executor(run, self.rate_limiter)
+            self._finish(run, RunStatus.COMPLETED)
+        except asyncio.CancelledError:
+            self._finish(run, RunStatus.INTERRUPTED if self._shutting_down else RunStatus.CANCELLED)
+        except Exception as e:
+            self._finish(run, RunStatus.FAILED, str(e))
+        finally:
+            self.tasks.pop(run.run_id, None)
+
+    def _finish(self, run: TestRun, status: str, error: Optional[str] = None) -> None:
+        run.status = status
+        run.phase = None
+        run.error = error
+        run.finished_at = datetime.now().isoformat()
+        self._trim_history()
+        self._save()
+        self._notify()
+
+    def _notify(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _trim_history(self) -> None:
+        finished = sorted(
+            (run for run in self.runs.values() if run.status in RunStatus.FINISHED),
+            key=lambda run: run.finished_at or run.queued_at
+        )
+        for run in finished[:max(0, len(finished) - self.MAX_HISTORY)]:
+            del self.runs[run.run_id]
+            shutil.rmtree(self.checkpoint_dir(run.run_id), ignore_errors=True)
+
+    def _load(self) -> None:
+        if not self.state_path.exists():
+            return
+        with open(self.state_path, 'r') as f:
+            data = json.load(f)
+        self.max_connections = data.get('max_connections', self.max_connections)
+        self.rate_limiter.set_rate(data.get('max_rate', self.rate_limiter.rate))
+        for run_data in data.get('runs', []):
+            run = TestRun(**run_data)
+            # A run that was executing when the process stopped cannot continue by itself
+            if run.status == RunStatus.RUNNING:
+                run.status = RunStatus.INTERRUPTED
+                run.phase = None
+                run.finished_at = datetime.now().isoformat()
+            self.runs[run.run_id] = run
+
+    def _save(self) -> None:
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_suffix('.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'max_connections': self.max_connections,
+                'max_rate': self.rate_limiter.rate,
+                'runs': [run.to_dict() for run in self.runs.values()]
+            }, f, indent=4)
+        tmp_path.replace(self.state_path)
+
+
+__all__ = ['RunStatus', 'TestRun', 'RateLimiter', 'RunScheduler']
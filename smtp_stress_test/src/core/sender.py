@@ -1,15 +1,56 @@
 import asyncio
+import base64
+import functools
 import logging
-from datetime import datetime
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import ExitStack
+from datetime import datetime, timedelta
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Union
+from typing import Iterator, List, Dict, Any, Optional, Tuple, Union
+import random
+import re
 import ssl
 import aiosmtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
+from email.message import Message
+from email.charset import Charset
+from email import encoders
 
-from .scenario import TestScenario
+from .scenario import EmailTemplate, TestScenario
+from .payload import get_synthetic_payload
+from .targets import SMTPTarget, TargetPool, TargetSelector
+from .source_address import SourceAddressPool, is_bind_error
+from .scheduler import RateLimiter
+from .checkpoint import RunCheckpoint
+from .control import RunControl
+from .attachments import AttachmentStore, is_attachment_ref, map_file
+from .monitor import GeneratorMonitor
+from .traffic_mix import MessageChoice, TrafficMix
+from .transfer import (DATA_MODES, MODE_ENCODINGS, dot_stuff, effective_mode, mode_mail_options, send_bdat,
+                       send_data)
+
+# Connection attempts with different source bindings before giving up
+BIND_ATTEMPTS = 3
+
+# UTF-8 text sent as is, for the 8bitmime and binarymime transfer modes
+_UTF8_8BIT = Charset('utf-8')
+_UTF8_8BIT.body_encoding = None
+_PLACEHOLDER = re.compile(rb'\x00([0-9a-f]{32})\x00')
+
+
+def _cancel_requested() -> bool:
+    """True if the current task was cancelled but the CancelledError got lost.
+
+    Before Python 3.12 asyncio.wait_for (used by aiosmtplib for every server
+    response) returns the result instead of raising when the cancellation races
+    with a response that already arrived; the task still counts the request.
+    """
+    cancelling = getattr(asyncio.current_task(), 'cancelling', None)
+    return bool(cancelling and cancelling())
 
 class ErrorCategory:
     AUTH = "Authentication Error"
@@ -46,24 +87,80 @@ class ErrorCategory:
         return ErrorCategory.OTHER, None
 
 class SMTPSender:
-    def __init__(self, scenario: TestScenario):
+    # Encoded messages kept for reuse; variants that do not fit are encoded again when needed
+    MESSAGE_CACHE_BYTES = 256 * 1024 * 1024
+
+    def __init__(self, scenario: TestScenario, rate_limiter: Optional[RateLimiter] = None,
+                 checkpoint: Optional[RunCheckpoint] = None,
+                 timeout_settings: Optional[Dict[str, float]] = None,
+                 control: Optional[RunControl] = None,
+                 attachment_store: Optional[AttachmentStore] = None):
         self.scenario = scenario
-        self.results: List[Dict[str, Any]] = []
+        # Resolves "sha256:<hex>" attachment references of the scenario
+        self.attachment_store = attachment_store
+        # Global send rate budget shared with other running tests
+        self.rate_limiter = rate_limiter
+        # Results are collected as they finish so a stopped run still has them
+        self.checkpoint = checkpoint
+        self.results: List[Dict[str, Any]] = checkpoint.load_results() if checkpoint else []
+        self._flushed = len(self.results)
+        self._flush_lock = asyncio.Lock()
+        # Emails a resumed run already attempted: thread_id -> email indices
+        self._completed = checkpoint.completed_indices(self.results) if checkpoint else {}
         self.logger = self._setup_logger()
         self._running_tasks: List[asyncio.Task] = []
-        # Alapértelmezett timeout beállítások
-        self.timeout_settings = {
-            "connect_timeout": 1.0,
-            "send_timeout": 1.0
-        }
-        # Próbáljuk meg lekérni a globális beállításokat az API-ból
-        asyncio.create_task(self._load_timeout_settings())
+        # Workers by id; the control can add or retire workers while the run goes
+        self._workers: Dict[int, asyncio.Task] = {}
+        self._work = iter(())
+        self._recipients: List[List[str]] = []
+        # Monotonic reference of the run; intended/actual start offsets are measured from it
+        self._run_start = time.perf_counter()
+        # Rate, concurrency, pause and timeouts, adjustable during the run
+        self.control = control or RunControl(scenario.num_threads, scenario.target_rate, timeout_settings)
+        # Shared with the control, so changed timeouts apply to the next connection or send
+        self.timeout_settings = self.control.timeout_settings
+        # Weighted message types; without a mix every email uses email_template
+        self.mix = TrafficMix(scenario.traffic_mix, scenario.traffic_mix_seed) if scenario.traffic_mix else None
+        self.templates: List[Tuple[str, EmailTemplate]] = (
+            [(entry.name, entry.template) for entry in scenario.traffic_mix] if scenario.traffic_mix
+            else [('default', scenario.email_template)]
+        )
+        # Synthetic payloads are generated once and shared by every send
+        self.payloads = [
+            get_synthetic_payload(template.synthetic_payload) if template.synthetic_payload else None
+            for _, template in self.templates
+        ]
+        # Variants are drawn per email from this seed, like the traffic mix does
+        self._payload_seed = (scenario.email_template.synthetic_payload.seed
+                              if scenario.email_template.synthetic_payload else 0)
+        # Attachment files encoded once, shared by every template and variant using them
+        self._attachment_parts: Dict[Any, MIMEApplication] = {}
+        # Encoded message (everything but From/To/Cc) per (template index, payload variant, body
+        # encoding, dot-stuffed), least recently used first, at most MESSAGE_CACHE_BYTES in total
+        self._encoded: OrderedDict[Tuple[int, int, str, bool], bytes] = OrderedDict()
+        self._encoded_bytes = 0
+        # Encodings in progress, shared by the sends waiting for the same message
+        self._encoding: Dict[Tuple[int, int, str, bool], asyncio.Future] = {}
+        self._ssl_context = self._create_ssl_context()
+        smtp_config = scenario.smtp_config
+        self.targets = TargetSelector(
+            [
+                TargetPool(target, smtp_config.max_connections_per_target, smtp_config.reuse_connections)
+                for target in smtp_config.get_targets()
+            ],
+            smtp_config.selection_strategy
+        )
+        self.source_addresses = SourceAddressPool(smtp_config.source_addresses) if smtp_config.source_addresses else None
+        # Loop lag, CPU, memory and sockets of the generator itself during the run
+        self.monitor = GeneratorMonitor(lambda: self.targets.in_flight)
+        self.logger.info(f"Timeout beállítások: {self.timeout_settings}")
 
     def _setup_logger(self) -> logging.Logger:
         logger = logging.getLogger(f"smtp_test_{self.scenario.name}")
         logger.setLevel(logging.INFO)
         
         log_path = Path("logs") / f"{self.scenario.name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.log"
+        log_path.parent.mkdir(exist_ok=True)
         file_handler = logging.FileHandler(log_path)
         file_handler.setLevel(logging.INFO)
         
@@ -73,72 +170,303 @@ class SMTPSender:
         
         return logger
 
-    async def send_email(self, email_index: int, recipients: List[str]) -> Dict[str, Any]:
-        msg = MIMEMultipart()
-        msg['From'] = self.scenario.email_template.from_email
-        msg['To'] = ', '.join(recipients)
-        msg['Subject'] = self.scenario.email_template.subject
-        
-        if self.scenario.email_template.cc_email:
-            msg['Cc'] = ', '.join(self.scenario.email_template.cc_email)
-        if self.scenario.email_template.bcc_email:
-            msg['Bcc'] = ', '.join(self.scenario.email_template.bcc_email)
-
-        msg.attach(MIMEText(self.scenario.email_template.body, 'plain'))
-
-        if self.scenario.email_template.attachments:
-            for attachment_path in self.scenario.email_template.attachments:
-                with open(attachment_path, 'rb') as f:
-                    part = MIMEApplication(f.read(), Name=attachment_path.name)
-                part['Content-Disposition'] = f'attachment; filename="{attachment_path.name}"'
-                msg.attach(part)
+    def _create_ssl_context(self) -> ssl.SSLContext:
+        # Create SSL context and set certificate verification based on scenario config
+        ssl_context = ssl.create_default_context()
+        if not self.scenario.smtp_config.verify_cert:
+            # Disable certificate verification if specified in the scenario
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE
+            self.logger.info("TLS/SSL certificate verification disabled for this scenario")
+        return ssl_context
 
-        start_time = datetime.now()
-        result = {
-            'email_index': email_index,
-            'start_time': start_time.isoformat(),
-            'status': 'failed',
-            'error': None,
-            'error_category': None,
-            'smtp_code': None,
-            'to': msg['To'],
-            'recipient_count': len(recipients)
-        }
-
-        try:
-            # Create SSL context and set certificate verification based on scenario config
-            ssl_context = ssl.create_default_context()
-            if not self.scenario.smtp_config.verify_cert:
-                # Disable certificate verification if specified in the scenario
-                ssl_context.check_hostname = False
-                ssl_context.verify_mode = ssl.CERT_NONE
-                self.logger.info("TLS/SSL certificate verification disabled for this scenario")
+    async def _connect(self, target: SMTPTarget, result: Dict[str, Any]) -> aiosmtplib.SMTP:
+        """Open and authenticate a new connection to one target"""
+        result['new_connection'] = True
+        attempts = BIND_ATTEMPTS if self.source_addresses else 1
+        for attempt in range(attempts):
+            source_address = self.source_addresses.next() if self.source_addresses else ('0.0.0.0', 0)  # Dinamikus forrás port használata
+            if self.source_addresses:
+                result['source_address'] = source_address[0]
 
             smtp = aiosmtplib.SMTP(
-                hostname=self.scenario.smtp_config.host,
-                port=self.scenario.smtp_config.port,
+                hostname=target.host,
+                port=target.port,
                 use_tls=self.scenario.smtp_config.use_tls,
-                tls_context=ssl_context,
-                source_address=('0.0.0.0', 0),  # Dinamikus forrás port használata
+                tls_context=self._ssl_context,
+                source_address=source_address,
                 local_hostname='smtptester.local',  # Fix hostname beállítása
                 timeout=self.timeout_settings["connect_timeout"]  # Dinamikus timeout beállítás
             )
             
-            # Timeout paraméter a gyorsabb kapcsolódásért
-            await smtp.connect(timeout=self.timeout_settings["connect_timeout"])
-            
+            try:
+                # Timeout paraméter a gyorsabb kapcsolódásért
+                await smtp.connect(timeout=self.timeout_settings["connect_timeout"])
+                break
+            except aiosmtplib.SMTPConnectError as e:
+                # Port still in TIME_WAIT or address not usable: try the next binding
+                if attempt + 1 < attempts and is_bind_error(e):
+                    self.logger.warning(f"Cannot bind {source_address[0]}:{source_address[1]}, trying next source address")
+                    continue
+                raise
+        
+        try:
             if self.scenario.smtp_config.username and self.scenario.smtp_config.password:
                 await smtp.login(
                     self.scenario.smtp_config.username,
                     self.scenario.smtp_config.password,
                     timeout=self.timeout_settings["send_timeout"]
                 )
+        except BaseException:
+            smtp.close()
+            raise
+        return smtp
+
+    @staticmethod
+    def _attachment_part(name: str, data: Union[bytes, memoryview]) -> MIMEApplication:
+        part = MIMEApplication(b'', Name=name, _encoder=encoders.encode_noop)
+        # Encoded straight from the buffer (bytes, memoryview or mmap), without copying the raw data
+        part.set_payload(base64.encodebytes(data).decode('ascii'))
+        part['Content-Transfer-Encoding'] = 'base64'
+        part['Content-Disposition'] = f'attachment; filename="{name}"'
+        return part
+
+    def _attachment_file(self, attachment: Union[Path, str]) -> tuple[Path, str]:
+        """File and attachment name of a scenario attachment"""
+        if is_attachment_ref(attachment):
+            if self.attachment_store is None:
+                raise ValueError(f"Attachment {attachment} needs an attachment store")
+            return self.attachment_store.resolve(attachment)
+        return Path(attachment), Path(attachment).name
+
+    def _encode_message(self, template_index: int, variant: int, encoding: str = 'base64',
+                        dot_stuffed: bool = False) -> bytes:
+        """Subject, body and attachments of a template; runs in a worker thread.
+
+        encoding is one of MODE_ENCODINGS: base64 keeps the message 7bit-safe, 8bit
+        leaves non-ASCII text unencoded and binary also puts attachments on the wire
+        as raw bytes. Lines end in CRLF, ready for BDAT, or dot-stuffed for DATA.
+        """
+        template = self.templates[template_index][1]
+        payload = self.payloads[template_index]
+        msg = MIMEMultipart()
+        msg['Subject'] = template.subject
+
+        body = payload.body_text(variant) if payload else None
+        body = body if body is not None else template.body
+        if encoding != 'base64' and not body.isascii():
+            msg.attach(MIMEText(body, 'plain', _UTF8_8BIT))
+        else:
+            msg.attach(MIMEText(body, 'plain'))
+
+        # Binary attachments are flattened as placeholders and spliced in afterwards,
+        # since the email package only writes text
+        binary_parts: Dict[bytes, Union[bytes, memoryview]] = {}
+        with ExitStack() as stack:
+            for attachment in template.attachments or []:
+                if encoding == 'binary':
+                    path, name = self._attachment_file(attachment)
+                    msg.attach(self._binary_part(name, stack.enter_context(map_file(path)), binary_parts))
+                    continue
+                part = self._attachment_parts.get(attachment)
+                if part is None:
+                    path, name = self._attachment_file(attachment)
+                    # Mapped rather than read, so large files are encoded straight from the page cache
+                    with map_file(path) as data:
+                        part = self._attachment_parts[attachment] = self._attachment_part(name, data)
+                msg.attach(part)
+
+            if payload:
+                for name, view in payload.attachment_views(variant):
+                    if encoding == 'binary':
+                        msg.attach(self._binary_part(name, view, binary_parts))
+                    else:
+                        msg.attach(self._attachment_part(name, view))
+
+            encoded = msg.as_bytes(policy=msg.policy.clone(linesep='\r\n'))
+            if binary_parts:
+                # Every odd piece is a placeholder token
+                pieces = _PLACEHOLDER.split(encoded)
+                pieces[1::2] = [binary_parts[token] for token in pieces[1::2]]
+                encoded = b''.join(pieces)
+        return dot_stuff(encoded) if dot_stuffed else encoded
+
+    @staticmethod
+    def _binary_part(name: str, data: Union[bytes, memoryview], binary_parts: Dict[bytes, Any]) -> MIMEApplication:
+        """Attachment part holding a placeholder for its raw bytes"""
+        token = uuid.uuid4().hex.encode('ascii')
+        binary_parts[token] = data
+        part = MIMEApplication(b'', Name=name, _encoder=encoders.encode_noop)
+        part.set_payload(f"\0{token.decode('ascii')}\0")
+        part['Content-Transfer-Encoding'] = 'binary'
+        part['Content-Disposition'] = f'attachment; filename="{name}"'
+        return part
+
+    async def _message_body(self, template_index: int, variant: int, mode: str) -> bytes:
+        """Encoded message of a template for a transfer mode, from the cache or encoded in a thread"""
+        key = (template_index, variant, MODE_ENCODINGS[mode], mode in DATA_MODES)
+        body = self._encoded.get(key)
+        if body is not None:
+            self._encoded.move_to_end(key)
+            return body
+        task = self._encoding.get(key)
+        if task is None:
+            task = self._encoding[key] = asyncio.ensure_future(asyncio.to_thread(self._encode_message, *key))
+            task.add_done_callback(functools.partial(self._encoding_done, key))
+        # Shielded: a cancelled send leaves the encoding to the other sends waiting for it
+        return await asyncio.shield(task)
+
+    def _encoding_done(self, key: Tuple[int, int, str, bool], task: asyncio.Future) -> None:
+        self._encoding.pop(key, None)
+        if not task.cancelled() and task.exception() is None:
+            self._cache_message(key, task.result())
+
+    def _cache_message(self, key: Tuple[int, int, str, bool], body: bytes) -> None:
+        self._encoded[key] = body
+        self._encoded_bytes += len(body)
+        # The newest message stays even if it alone is over the limit
+        while self._encoded_bytes > self.MESSAGE_CACHE_BYTES and len(self._encoded) > 1:
+            _, evicted = self._encoded.popitem(last=False)
+            self._encoded_bytes -= len(evicted)
+
+    def _header_block(self, message: MessageChoice, dot_stuffed: bool = False) -> bytes:
+        """From/To/Cc of one send, written in front of the cached message body"""
+        template = self.templates[message.template_index][1]
+        headers = Message()
+        headers['From'] = message.from_email
+        headers['To'] = ', '.join(message.recipients)
+        if template.cc_email:
+            headers['Cc'] = ', '.join(template.cc_email)
+        # as_bytes() ends the header block with an empty line; the template's own headers follow it
+        header_block = headers.as_bytes(policy=headers.policy.clone(linesep='\r\n'))[:-2]
+        return dot_stuff(header_block) if dot_stuffed else header_block
+
+    def _prepare_messages(self) -> None:
+        """Encode templates and payload variants for the transfer mode before the run starts.
+
+        Variant by variant across the templates, until the message cache is full;
+        the rest are encoded when a send first needs them.
+        """
+        mode = self.scenario.smtp_config.transfer_mode
+        variants = [payload.spec.variants if payload else 1 for payload in self.payloads]
+        failed = set()
+        for variant in range(max(variants)):
+            for template_index in range(len(self.templates)):
+                if variant >= variants[template_index] or template_index in failed:
+                    continue
+                if self._encoded_bytes >= self.MESSAGE_CACHE_BYTES:
+                    return
+                key = (template_index, variant, MODE_ENCODINGS[mode], mode in DATA_MODES)
+                try:
+                    self._cache_message(key, self._encode_message(*key))
+                except Exception as e:
+                    # Left to the sends, which record the error in their results
+                    self.logger.error(f"Cannot encode template {self.templates[template_index][0]}: {str(e)}")
+                    failed.add(template_index)
+
+    def _choose_message(self, overall_index: int) -> MessageChoice:
+        """Template, sender and recipients of the overall_index-th email of the run"""
+        if self.mix:
+            return self.mix.pick(overall_index)
+        template = self.scenario.email_template
+        # Számold ki, mely címzettek tartoznak ehhez az e-mailhez
+        all_recipients = self._recipients
+        recipients = all_recipients[overall_index % len(all_recipients)] if overall_index < len(all_recipients) else all_recipients[0]
+        payload = self.payloads[0]
+        variant = 0
+        if payload:
+            # Seeded per email, so the same (thread, email) gets the same variant in every run and on resume
+            variant = random.Random((self._payload_seed << 32) + overall_index).randrange(payload.spec.variants)
+        return MessageChoice(0, template.from_email, recipients, variant)
+
+    async def _greet(self, smtp: aiosmtplib.SMTP) -> None:
+        """EHLO (HELO if refused) once per connection, so the server's extensions are known"""
+        if smtp.is_ehlo_or_helo_needed:
+            try:
+                await smtp.ehlo(timeout=self.timeout_settings["send_timeout"])
+            except aiosmtplib.SMTPHeloError:
+                await smtp.helo(timeout=self.timeout_settings["send_timeout"])
+
+    @staticmethod
+    def _mail_options(smtp: aiosmtplib.SMTP, sender: str, recipients: List[str], mode: str, size: int) -> List[str]:
+        """MAIL FROM options: SMTPUTF8 where needed, BODY and SIZE as the transfer mode requires"""
+        options = []
+        if not (sender + ''.join(recipients)).isascii():
+            if not smtp.supports_extension("smtputf8"):
+                raise aiosmtplib.SMTPNotSupported(
+                    "An address containing non-ASCII characters was provided, but "
+                    "SMTPUTF8 is not supported by this server"
+                )
+            options.append("SMTPUTF8")
+        return options + mode_mail_options(smtp, mode, size)
 
-            await smtp.send_message(msg, timeout=self.timeout_settings["send_timeout"])
-            await smtp.quit(timeout=self.timeout_settings["send_timeout"])
+    async def send_email(self, email_index: int, message: MessageChoice,
+                         intended_start: Optional[float] = None) -> Dict[str, Any]:
+        """Send one email; intended_start is the perf_counter() time the send was due.
+
+        Durations come from the monotonic clock, wall-clock times are only kept to
+        place the send on the report timeline. The delay between the intended and the
+        actual start is recorded so coordinated omission can be corrected for.
+        """
+        template = self.templates[message.template_index][1]
+        transfer_mode = self.scenario.smtp_config.transfer_mode
+        # Encoded for the requested mode up front; a server without its extensions gets a fallback.
+        # A message that is not cached yet delays the send, which shows as schedule lag
+        body = await self._message_body(message.template_index, message.variant, transfer_mode)
+        header_block = self._header_block(message, transfer_mode in DATA_MODES)
+        to = ', '.join(message.recipients)
+        # Bcc recipients get the message but never see the header, as with send_message
+        envelope = message.recipients + (template.cc_email or []) + (template.bcc_email or [])
+        pool = self.targets.select(message.recipients)
+
+        start = time.perf_counter()
+        start_time = datetime.now()
+        result = {
+            'email_index': email_index,
+            'start_time': start_time.isoformat(),
+            'start_offset': start - self._run_start,
+            'intended_offset': (start if intended_start is None else intended_start) - self._run_start,
+            'status': 'failed',
+            'error': None,
+            'error_category': None,
+            'smtp_code': None,
+            'to': to,
+            'recipient_count': len(message.recipients),
+            'target': pool.target.key,
+            'template': self.templates[message.template_index][0],
+            'transfer_mode': transfer_mode,
+            'message_size': len(header_block) + len(body)
+        }
+
+        try:
+            smtp, result['new_connection'] = await pool.acquire(functools.partial(self._connect, result=result))
+            if self.source_addresses and smtp.source_address:
+                result['source_address'] = smtp.source_address[0]
+            sent = False
+            try:
+                await self._greet(smtp)
+                mode = effective_mode(smtp, transfer_mode)
+                if mode != transfer_mode:
+                    body = await self._message_body(message.template_index, message.variant, mode)
+                    header_block = self._header_block(message, mode in DATA_MODES)
+                # Header block and body are written one after the other, never joined
+                buffers = [header_block, body]
+                size = len(header_block) + len(body)
+                result['transfer_mode'], result['message_size'] = mode, size
+                options = self._mail_options(smtp, message.from_email, envelope, mode, size)
+                if mode in DATA_MODES:
+                    await send_data(smtp, message.from_email, envelope, buffers, options,
+                                    self.timeout_settings["send_timeout"])
+                else:
+                    await send_bdat(smtp, message.from_email, envelope, buffers,
+                                    self.scenario.smtp_config.bdat_chunk_size, options,
+                                    self.timeout_settings["send_timeout"])
+                sent = True
+            finally:
+                await pool.release(smtp, sent, self.timeout_settings["send_timeout"])
             
             result['status'] = 'success'
-            self.logger.info(f"Email {email_index} sent successfully to {msg['To']}")
+            self.logger.info(f"Email {email_index} sent successfully to {to} via {pool.target.key}")
             
         except Exception as e:
             error_category, smtp_code = ErrorCategory.categorize_error(e)
@@ -151,16 +479,17 @@ class SMTPSender:
             })
             
             self.logger.error(
-                f"Failed to send email {email_index} to {msg['To']}: "
+                f"Failed to send email {email_index} to {to} via {pool.target.key}: "
                 f"[{error_category}] {error_msg}"
                 + (f" (SMTP code: {smtp_code})" if smtp_code else "")
             )
             
         finally:
-            end_time = datetime.now()
-            result['end_time'] = end_time.isoformat()
-            result['duration'] = (end_time - start_time).total_seconds()
-            return result
+            duration = time.perf_counter() - start
+            # Derived from the monotonic duration so a clock step cannot distort it
+            result['end_time'] = (start_time + timedelta(seconds=duration)).isoformat()
+            result['duration'] = duration
+        return result
 
     def _distribute_recipients(self) -> List[List[str]]:
         """Distribute recipients across threads and emails evenly"""
@@ -187,29 +516,42 @@ class SMTPSender:
                 
         return distributed_recipients
 
-    async def run_thread(self, thread_id: int) -> List[Dict[str, Any]]:
-        thread_results = []
-        all_recipients = self._distribute_recipients()
-        
+    def _work_items(self) -> Iterator[Tuple[int, int]]:
+        """(thread_id, email_index) of every email still to send, spread evenly over the threads"""
+        for email_index in range(self.scenario.emails_per_thread):
+            for thread_id in range(self.scenario.num_threads):
+                if email_index not in self._completed.get(thread_id, ()):
+                    yield thread_id, email_index
+
+    async def run_worker(self, worker_id: int) -> None:
+        """Send emails from the shared work queue until it is empty or the run is scaled down"""
         try:
-            # Számold ki a szálon belül küldendő e-mailek mennyiségét
-            emails_per_thread = self.scenario.emails_per_thread
-            
-            for email_index in range(emails_per_thread):
-                # Számold ki, mely címzettek tartoznak ehhez az e-mailhez
-                overall_index = thread_id * emails_per_thread + email_index
-                recipients = all_recipients[overall_index % len(all_recipients)] if overall_index < len(all_recipients) else all_recipients[0]
+            while worker_id < self.control.concurrency:
+                intended_start = await self.control.next_start()
+                if worker_id >= self.control.concurrency:
+                    break
+                item = next(self._work, None)
+                if item is None:
+                    break
+                thread_id, email_index = item
                 
                 try:
-                    result = await self.send_email(email_index, recipients)
-                    thread_results.append(result)
-                    await asyncio.sleep(self.scenario.delay_between_emails)
+                    message = self._choose_message(thread_id * self.scenario.emails_per_thread + email_index)
+                    if self.rate_limiter:
+                        await self.rate_limiter.acquire()
+                    result = await self.send_email(email_index, message, intended_start)
+                    result['thread_id'] = thread_id
+                    self.results.append(result)
+                    if _cancel_requested():
+                        raise asyncio.CancelledError()
+                    if not self.control.target_rate:
+                        await asyncio.sleep(self.scenario.delay_between_emails)
                 except asyncio.CancelledError:
-                    self.logger.info(f"Thread {thread_id} cancelled during email sending")
+                    self.logger.info(f"Worker {worker_id} cancelled during email sending")
                     raise
                 except Exception as e:
-                    self.logger.error(f"Error in thread {thread_id}: {str(e)}")
-                    thread_results.append({
+                    self.logger.error(f"Error in worker {worker_id}: {str(e)}")
+                    self.results.append({
                         "thread_id": thread_id,
                         "email_index": email_index,
                         "status": "error",
@@ -217,24 +559,78 @@ class SMTPSender:
                         "timestamp": datetime.now().isoformat()
                     })
         except asyncio.CancelledError:
-            self.logger.info(f"Thread {thread_id} cancelled")
+            self.logger.info(f"Worker {worker_id} cancelled")
             raise
-            
-        return thread_results
+
+    def _spawn_workers(self) -> None:
+        """Start a worker for every concurrency slot that has none running"""
+        for worker_id in range(self.control.concurrency):
+            task = self._workers.get(worker_id)
+            if task is None or task.done():
+                task = asyncio.create_task(self.run_worker(worker_id))
+                self._workers[worker_id] = task
+                self._running_tasks.append(task)
+
+    def _on_control_change(self, annotation: Dict[str, Any]) -> None:
+        self.logger.info(f"Run control changed: {annotation['previous']} -> {annotation['changes']}")
+        if 'concurrency' in annotation['changes']:
+            self._spawn_workers()
+        if self.checkpoint:
+            try:
+                self.checkpoint.add_annotation(annotation)
+            except Exception as e:
+                self.logger.error(f"Failed to write checkpoint: {str(e)}")
+
+    def flush_checkpoint(self) -> None:
+        """Write results finished since the last checkpoint to disk"""
+        if not self.checkpoint:
+            return
+        pending = self.results[self._flushed:]
+        self._flushed += len(pending)
+        try:
+            self.checkpoint.flush(pending)
+        except Exception as e:
+            self.logger.error(f"Failed to write checkpoint: {str(e)}")
+
+    async def _flush_in_thread(self) -> None:
+        """flush_checkpoint off the event loop, one flush at a time so results are written in order"""
+        async with self._flush_lock:
+            await asyncio.to_thread(self.flush_checkpoint)
+
+    async def _checkpoint_loop(self) -> None:
+        interval = self.scenario.checkpoint_interval_minutes * 60
+        while True:
+            await asyncio.sleep(interval)
+            # Shielded: a flush cut off when the run ends still completes before the final one
+            await asyncio.shield(self._flush_in_thread())
+            self.logger.info(f"Checkpoint written: {len(self.results)} results")
 
     async def run_test(self) -> List[Dict[str, Any]]:
+        # Encoding large messages would otherwise stall the first sends and the event loop
+        await asyncio.to_thread(self._prepare_messages)
+        self._run_start = time.perf_counter()
+        self.control.start(self._run_start)
+        self.control.add_listener(self._on_control_change)
+        self._recipients = [] if self.mix else self._distribute_recipients()
+        self._work = self._work_items()
+        checkpoint_task = None
+        if self.checkpoint and self.scenario.checkpoint_interval_minutes > 0:
+            checkpoint_task = asyncio.create_task(self._checkpoint_loop())
+        monitor_task = asyncio.create_task(self.monitor.run())
         try:
-            threads = []
-            for thread_id in range(self.scenario.num_threads):
-                task = asyncio.create_task(self.run_thread(thread_id))
-                self._running_tasks.append(task)
-                threads.append(task)
+            self._spawn_workers()
             
             try:
-                # Wait for all threads to complete
-                results = await asyncio.gather(*threads)
-                # Flatten results from all threads
-                self.results = [item for sublist in results for item in sublist]
+                # Wait until no worker is left, including ones added while waiting;
+                # results are collected in self.results
+                while True:
+                    workers = [task for task in self._workers.values() if not task.done()]
+                    if not workers:
+                        break
+                    await asyncio.wait(workers)
+                for task in self._workers.values():
+                    if not task.cancelled() and task.exception():
+                        raise task.exception()
                 return self.results
             except asyncio.CancelledError:
                 # Cancel all running tasks
@@ -246,24 +642,16 @@ class SMTPSender:
                 self.logger.info("Test execution cancelled")
                 raise
             finally:
+                self.control.remove_listener(self._on_control_change)
                 self._running_tasks.clear()
+                self._workers.clear()
+                await self.targets.close()
         except Exception as e:
             self.logger.error(f"Error during test execution: {str(e)}")
             raise
-
-    async def _load_timeout_settings(self):
-        """Timeout beállítások lekérése az API-ból"""
-        try:
-            # Mivel közvetlenül nem tudunk HTTP kérést indítani a belső API-hoz a modell miatt,
-            # itt feltételezzük, hogy a globális timeout_settings változók már be vannak állítva
-            # az app.py-ban, és azokat fogjuk használni
-            from ..api.app import timeout_settings
-            self.timeout_settings = timeout_settings.copy()
-            self.logger.info(f"Timeout beállítások betöltve: {self.timeout_settings}")
-        except Exception as e:
-            self.logger.warning(f"Nem sikerült betölteni a timeout beállításokat: {str(e)}, alapértelmezett értékek használata")
-            # Alapértelmezett értékek használata, ha hiba történik
-            self.timeout_settings = {
-                "connect_timeout": 1.0,
-                "send_timeout": 1.0
-            }
+        finally:
+            monitor_task.cancel()
+            if checkpoint_task:
+                checkpoint_task.cancel()
+            # Every worker is done; writing a whole run's results can take a while
+            await self._flush_in_thread()
@@ -0,0 +1,70 @@
+import errno
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+
+@dataclass
+class SourceAddress:
+    host: str
+    port_range: Optional[Tuple[int, int]] = None
+
+    @classmethod
+    def from_value(cls, value: Union[str, Dict[str, Any]]) -> 'SourceAddress':
+        if isinstance(value, str):
+            return cls(host=value)
+        port_range = value.get('port_range')
+        if port_range:
+            low, high = int(port_range[0]), int(port_range[1])
+            if not 0 < low <= high <= 65535:
+                raise ValueError(f"Invalid port range for {value['host']}: {port_range}")
+            port_range = (low, high)
+        return cls(host=value['host'], port_range=port_range)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'host': self.host,
+            'port_range': list(self.port_range) if self.port_range else None
+        }
+
+
+class SourceAddressPool:
+    """Round-robin local (address, port) bindings for outgoing connections.
+
+    Spreading connections over several local addresses multiplies the available
+    ephemeral ports, so large runs are not limited by TIME_WAIT on one address.
+    """
+
+    # Next port offset per (host, port range), shared by every pool in the process, so
+    # concurrent runs binding the same range step through it together instead of each
+    # starting at its low end and colliding on ports the other run has bound
+    _port_cursors: Dict[Tuple[str, Tuple[int, int]], int] = {}
+
+    def __init__(self, addresses: List[SourceAddress]):
+        if not addresses:
+            raise ValueError("Source address pool must not be empty")
+        self.addresses = addresses
+        self._next = 0
+
+    def next(self) -> Tuple[str, int]:
+        address = self.addresses[self._next % len(self.addresses)]
+        self._next += 1
+
+        if not address.port_range:
+            return address.host, 0
+        low, high = address.port_range
+        key = (address.host, address.port_range)
+        offset = self._port_cursors.get(key, 0)
+        self._port_cursors[key] = (offset + 1) % (high - low + 1)
+        return address.host, low + offset
+
+
+def is_bind_error(error: BaseException) -> bool:
+    """True if a connect failed because the local (address, port) could not be bound"""
+    while error is not None:
+        if isinstance(error, OSError) and error.errno in (errno.EADDRINUSE, errno.EADDRNOTAVAIL):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+__all__ = ['SourceAddress', 'SourceAddressPool', 'is_bind_error']
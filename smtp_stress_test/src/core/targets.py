@@ -0,0 +1,151 @@
+import asyncio
+import math
+import zlib
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import aiosmtplib
+
+
+@dataclass
+class SMTPTarget:
+    host: str
+    port: int
+    weight: float = 1.0
+    max_connections: Optional[int] = None
+
+    @property
+    def key(self) -> str:
+        return f"{self.host}:{self.port}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'host': self.host,
+            'port': self.port,
+            'weight': self.weight,
+            'max_connections': self.max_connections
+        }
+
+
+class TargetPool:
+    """Connection pool and in-flight accounting for one SMTP target"""
+
+    def __init__(self, target: SMTPTarget, max_connections: Optional[int] = None, reuse_connections: bool = False):
+        self.target = target
+        self.reuse_connections = reuse_connections
+        limit = target.max_connections or max_connections
+        self._semaphore = asyncio.Semaphore(limit) if limit else None
+        self._idle: List[aiosmtplib.SMTP] = []
+        self.in_flight = 0
+        self.opened_connections = 0
+
+    async def acquire(self, connect: Callable[[SMTPTarget], Awaitable[aiosmtplib.SMTP]]) -> Tuple[aiosmtplib.SMTP, bool]:
+        """Idle or newly opened connection, and whether it was opened for this call"""
+        if self._semaphore:
+            await self._semaphore.acquire()
+        self.in_flight += 1
+        try:
+            while self._idle:
+                smtp = self._idle.pop()
+                if smtp.is_connected:
+                    return smtp, False
+            smtp = await connect(self.target)
+            self.opened_connections += 1
+            return smtp, True
+        except BaseException:
+            self._release_slot()
+            raise
+
+    async def release(self, smtp: aiosmtplib.SMTP, healthy: bool, timeout: float) -> None:
+        """Return a connection to the pool, or close it when it must not be reused"""
+        try:
+            if healthy and self.reuse_connections and smtp.is_connected:
+                self._idle.append(smtp)
+            elif healthy:
+                await smtp.quit(timeout=timeout)
+            else:
+                smtp.close()
+        except Exception:
+            smtp.close()
+        finally:
+            self._release_slot()
+
+    async def close(self) -> None:
+        while self._idle:
+            smtp = self._idle.pop()
+            try:
+                await smtp.quit(timeout=1.0)
+            except Exception:
+                smtp.close()
+
+    def _release_slot(self) -> None:
+        self.in_flight -= 1
+        if self._semaphore:
+            self._semaphore.release()
+
+
+class TargetSelector:
+    """Pick the target pool for each message according to the scenario's strategy"""
+
+    STRATEGIES = ('round_robin', 'weighted', 'least_in_flight', 'sticky_domain')
+
+    def __init__(self, pools: List[TargetPool], strategy: str = 'round_robin'):
+        if not pools:
+            raise ValueError("At least one SMTP target is required")
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown target selection strategy: {strategy}")
+        self.pools = pools
+        self.strategy = strategy
+        self._next = 0
+        # Smooth weighted round-robin state (same algorithm as nginx upstreams)
+        self._current_weights = [0.0] * len(pools)
+
+    def select(self, recipients: List[str]) -> TargetPool:
+        if len(self.pools) == 1:
+            return self.pools[0]
+        if self.strategy == 'weighted':
+            return self._select_weighted()
+        if self.strategy == 'least_in_flight':
+            return self._select_least_in_flight()
+        if self.strategy == 'sticky_domain':
+            return self._select_sticky(recipients)
+        pool = self.pools[self._next % len(self.pools)]
+        self._next += 1
+        return pool
+
+    def _select_weighted(self) -> TargetPool:
+        total = 0.0
+        best = 0
+        for i, pool in enumerate(self.pools):
+            self._current_weights[i] += pool.target.weight
+            total += pool.target.weight
+            if self._current_weights[i] > self._current_weights[best]:
+                best = i
+        self._current_weights[best] -= total
+        return self.pools[best]
+
+    def _select_least_in_flight(self) -> TargetPool:
+        # Rotate the start position so ties are spread evenly
+        start = self._next % len(self.pools)
+        self._next += 1
+        ordered = self.pools[start:] + self.pools[:start]
+        return min(ordered, key=lambda pool: pool.in_flight / max(pool.target.weight, 1e-9))
+
+    def _select_sticky(self, recipients: List[str]) -> TargetPool:
+        domain = recipients[0].rsplit('@', 1)[-1].lower() if recipients else ''
+        # Weighted rendezvous hashing: a domain keeps its target while the pool is unchanged
+        def score(pool: TargetPool) -> float:
+            h = zlib.crc32(f"{domain}|{pool.target.key}".encode()) / 2 ** 32
+            return -pool.target.weight / math.log(min(max(h, 1e-12), 1 - 1e-12))
+        return max(self.pools, key=score)
+
+    @property
+    def in_flight(self) -> int:
+        return sum(pool.in_flight for pool in self.pools)
+
+    async def close(self) -> None:
+        for pool in self.pools:
+            await pool.close()
+
+
+__all__ = ['SMTPTarget', 'TargetPool', 'TargetSelector']
@@ -0,0 +1,58 @@
+import bisect
+import itertools
+import random
+from dataclasses import dataclass
+from typing import List
+
+from .scenario import MixTemplate
+
+
+@dataclass
+class MessageChoice:
+    """What one email of the run is: its template, sender, recipients and payload variant"""
+    template_index: int
+    from_email: str
+    recipients: List[str]
+    variant: int = 0
+
+
+class TrafficMix:
+    """Weighted choice of the message type, sender and recipients of every email.
+
+    Each email draws from its own generator seeded with (seed, email number), so a
+    run sends the same mix whatever order the workers take the emails in, and a
+    resumed run continues it unchanged.
+    """
+
+    def __init__(self, templates: List[MixTemplate], seed: int = 0):
+        if not templates:
+            raise ValueError("A traffic mix needs at least one template")
+        self.templates = templates
+        self.seed = seed
+        self._cum_weights = list(itertools.accumulate(entry.weight for entry in templates))
+
+    def pick(self, index: int) -> MessageChoice:
+        rng = random.Random((self.seed << 32) + index)
+        template_index = bisect.bisect_right(self._cum_weights, rng.random() * self._cum_weights[-1])
+        template_index = min(template_index, len(self.templates) - 1)
+        entry = self.templates[template_index]
+        template = entry.template
+
+        from_email = rng.choice(entry.from_emails) if entry.from_emails else template.from_email
+        count = entry.recipient_count.sample(rng) if entry.recipient_count else 1
+        count = min(max(count, 1), len(template.to_email))
+        # Consecutive addresses from a random position, wrapping around the list
+        first = rng.randrange(len(template.to_email))
+        recipients = [template.to_email[(first + i) % len(template.to_email)] for i in range(count)]
+
+        spec = template.synthetic_payload
+        variant = rng.randrange(spec.variants) if spec else 0
+        return MessageChoice(template_index, from_email, recipients, variant)
+
+    def shares(self) -> List[float]:
+        """Configured share of each template in percent"""
+        total = self._cum_weights[-1]
+        return [entry.weight / total * 100 for entry in self.templates]
+
+
+__all__ = ['MessageChoice', 'TrafficMix']
@@ -0,0 +1,187 @@
+import asyncio
+import re
+from typing import Iterator, List, Sequence, Union
+
+import aiosmtplib
+from aiosmtplib.protocol import SMTPProtocol
+
+# data: DATA command, 7bit-safe content (base64 attachments), as send_message does
+# 8bitmime: DATA with 8bit text parts, needs 8BITMIME
+# bdat: BDAT chunks (CHUNKING), no dot-stuffing or line scanning, 7bit-safe content
+# binarymime: BDAT with raw binary attachments and 8bit text, needs CHUNKING and BINARYMIME
+TRANSFER_MODES = ('data', '8bitmime', 'bdat', 'binarymime')
+# How each mode encodes message bodies
+MODE_ENCODINGS = {'data': 'base64', '8bitmime': '8bit', 'bdat': 'base64', 'binarymime': 'binary'}
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+# Modes whose message goes through DATA, where lines starting with a period are doubled
+DATA_MODES = ('data', '8bitmime')
+# Bytes handed to the transport at a time; the next slice waits until the transport has drained
+WRITE_SLICE = 256 * 1024
+
+# A message as written to the connection: the per-send header block, then the cached body
+MessageBuffers = Sequence[Union[bytes, memoryview]]
+
+_PERIOD_LINE = re.compile(rb"(?m)^\.")
+
+
+def effective_mode(smtp: aiosmtplib.SMTP, requested: str) -> str:
+    """The requested mode, or the closest one the server advertises (data as the last resort)"""
+    chunking = smtp.supports_extension('chunking')
+    if requested == 'binarymime' and chunking and smtp.supports_extension('binarymime'):
+        return 'binarymime'
+    if requested in ('bdat', 'binarymime') and chunking:
+        return 'bdat'
+    if requested == '8bitmime' and smtp.supports_extension('8bitmime'):
+        return '8bitmime'
+    return 'data'
+
+
+def mode_mail_options(smtp: aiosmtplib.SMTP, mode: str, size: int) -> List[str]:
+    """BODY and SIZE parameters of MAIL FROM for a transfer mode"""
+    options = []
+    if mode == 'binarymime':
+        options.append('BODY=BINARYMIME')
+    elif smtp.supports_extension('8bitmime'):
+        options.append('BODY=8BITMIME')
+    if smtp.supports_extension('size'):
+        options.append(f'SIZE={size}')
+    return options
+
+
+def dot_stuff(data: bytes) -> bytes:
+    """Double the periods starting a line, as DATA requires (RFC 5321 4.5.2); data itself if there are none.
+
+    Buffers stuffed one by one equal the stuffed whole as long as each starts a line.
+    """
+    return _PERIOD_LINE.sub(b"..", data) if _PERIOD_LINE.search(data) else data
+
+
+async def _envelope(smtp: aiosmtplib.SMTP, sender: str, recipients: List[str], mail_options: List[str],
+                    timeout: float) -> None:
+    """MAIL and RCPT commands; like sendmail, fails only if every recipient is refused"""
+    encoding = 'utf-8' if 'SMTPUTF8' in mail_options else 'ascii'
+    await smtp.mail(sender, options=mail_options, encoding=encoding, timeout=timeout)
+    refused = []
+    for recipient in recipients:
+        try:
+            await smtp.rcpt(recipient, encoding=encoding, timeout=timeout)
+        except aiosmtplib.SMTPRecipientRefused as e:
+            refused.append(e)
+    if len(refused) == len(recipients):
+        raise aiosmtplib.SMTPRecipientsRefused(refused)
+
+
+async def _write_and_read(smtp: aiosmtplib.SMTP, pieces: Sequence[Union[bytes, memoryview]],
+                          timeout: float) -> aiosmtplib.SMTPResponse:
+    """Write straight to aiosmtplib's protocol and wait for the reply.
+
+    Pieces go out in slices of WRITE_SLICE bytes, each after the transport has drained
+    below its high-water mark, so a large message is sent at the pace of the connection
+    instead of piling up in the transport buffer. A lost connection, a write that cannot
+    drain or a timed out response closes the connection, as the protocol can no longer
+    tell which command a late reply belongs to.
+    """
+    protocol = smtp.protocol
+    if protocol is None:
+        raise aiosmtplib.SMTPServerDisconnected("Server not connected")
+    try:
+        # Expect the reply before writing, as aiosmtplib's execute_command does: it can
+        # arrive while a slice waits to drain and would otherwise be dropped as unsolicited
+        protocol._response_pending = True
+        for piece in pieces:
+            view = memoryview(piece)
+            for offset in range(0, len(view), WRITE_SLICE):
+                protocol.write(view[offset:offset + WRITE_SLICE])
+                await _drain(protocol, timeout)
+        return await protocol.read_response(timeout=timeout)
+    except (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPTimeoutError):
+        smtp.close()
+        raise
+
+
+async def _drain(protocol: SMTPProtocol, timeout: float) -> None:
+    """Wait until the transport buffer is below its low-water mark, like StreamWriter.drain()"""
+    transport = protocol.transport
+    if transport is None or transport.get_write_buffer_size() <= transport.get_write_buffer_limits()[1]:
+        return
+    try:
+        await asyncio.wait_for(protocol._drain_helper(), timeout)
+    except asyncio.TimeoutError as e:
+        raise aiosmtplib.SMTPTimeoutError("Timed out writing to server") from e
+    except ConnectionResetError as e:
+        raise aiosmtplib.SMTPServerDisconnected("Connection lost") from e
+
+
+async def _reset_on_error(smtp: aiosmtplib.SMTP, timeout: float) -> None:
+    try:
+        await smtp.rset(timeout=timeout)
+    except (ConnectionError, aiosmtplib.SMTPException):
+        pass
+
+
+async def send_data(smtp: aiosmtplib.SMTP, sender: str, recipients: List[str], buffers: MessageBuffers,
+                    mail_options: List[str], timeout: float) -> None:
+    """Send a message with DATA; the buffers must be dot-stuffed and use CRLF line endings.
+
+    sendmail would join, normalize and stuff the whole message on every send; the
+    buffers are written as they are instead, so a cached message body is never copied.
+    """
+    try:
+        await _envelope(smtp, sender, recipients, mail_options, timeout)
+        response = await _write_and_read(smtp, [b"DATA\r\n"], timeout)
+        if response.code != aiosmtplib.SMTPStatus.start_input:
+            raise aiosmtplib.SMTPDataError(response.code, response.message)
+        ends_with_crlf = bytes(buffers[-1][-2:]) == b"\r\n" if buffers else False
+        terminator = b".\r\n" if ends_with_crlf else b"\r\n.\r\n"
+        response = await _write_and_read(smtp, [*buffers, terminator], timeout)
+        if response.code != aiosmtplib.SMTPStatus.completed:
+            raise aiosmtplib.SMTPDataError(response.code, response.message)
+    except (aiosmtplib.SMTPResponseException, aiosmtplib.SMTPRecipientsRefused):
+        await _reset_on_error(smtp, timeout)
+        raise
+
+
+async def send_bdat(smtp: aiosmtplib.SMTP, sender: str, recipients: List[str], buffers: MessageBuffers,
+                    chunk_size: int, mail_options: List[str], timeout: float) -> None:
+    """Send a message with BDAT chunks (RFC 3030); the buffers must use CRLF line endings.
+
+    aiosmtplib has no BDAT command, so the chunks are written to its protocol directly,
+    as memoryviews of the buffers. Envelope errors reset the transaction like sendmail does.
+    """
+    try:
+        await _envelope(smtp, sender, recipients, mail_options, timeout)
+        total = sum(len(buffer) for buffer in buffers)
+        sent = 0
+        for chunk in _chunks(buffers, chunk_size):
+            size = sum(len(piece) for piece in chunk)
+            sent += size
+            last = sent >= total
+            command = f"BDAT {size}{' LAST' if last else ''}\r\n".encode('ascii')
+            response = await _write_and_read(smtp, [command, *chunk], timeout)
+            if response.code != aiosmtplib.SMTPStatus.completed:
+                raise aiosmtplib.SMTPDataError(response.code, response.message)
+    except (aiosmtplib.SMTPResponseException, aiosmtplib.SMTPRecipientsRefused):
+        await _reset_on_error(smtp, timeout)
+        raise
+
+
+def _chunks(buffers: MessageBuffers, chunk_size: int) -> Iterator[List[memoryview]]:
+    """Views of the buffers grouped into chunks of chunk_size bytes (the last one shorter), without copying"""
+    chunk: List[memoryview] = []
+    size = 0
+    for buffer in buffers:
+        view = memoryview(buffer)
+        while len(view):
+            piece = view[:chunk_size - size]
+            chunk.append(piece)
+            size += len(piece)
+            view = view[len(piece):]
+            if size == chunk_size:
+                yield chunk
+                chunk, size = [], 0
+    if chunk:
+        yield chunk
+
+
+__all__ = ['TRANSFER_MODES', 'MODE_ENCODINGS', 'DEFAULT_CHUNK_SIZE', 'DATA_MODES', 'MessageBuffers',
+           'effective_mode', 'mode_mail_options', 'dot_stuff', 'send_data', 'send_bdat']